@@ -104,6 +104,21 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Course payloads are cached per process by default; point "default" at a
+# shared backend (Redis, Memcached) when running several workers.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "lms",
+    }
+}
+
+COURSE_CACHE_ALIAS = "default"
+COURSE_CACHE_TIMEOUT = 60 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -237,3 +252,39 @@ LOGGING = {
         },
     },
 }
+
+# Number of CourseLikeCounter rows per course that likes are spread over
+COURSE_LIKE_SHARDS = 16
+
+# how course videos are streamed: None sends them from Django (sendfile() where
+# the WSGI server supports it); "X-Accel-Redirect" (nginx, internal location
+# VIDEO_STREAM_ACCEL_PREFIX mapped to MEDIA_ROOT) or "X-Sendfile" hand the
+# file to the front server
+VIDEO_STREAM_OFFLOAD = None
+VIDEO_STREAM_ACCEL_PREFIX = "/protected-media/"
+
+# resumable video uploads are assembled here (shared by all workers), and
+# sessions untouched for VIDEO_UPLOAD_SESSION_TIMEOUT seconds are removed by
+# the cleanup_video_uploads command. The temp file is preallocated at the
+# announced size, which VIDEO_UPLOAD_MAX_SIZE bounds; VIDEO_UPLOAD_MIN_CHUNK_SIZE
+# bounds the number of chunks an upload can be split into
+VIDEO_UPLOAD_TEMP_DIR = BASE_DIR / "uploads"
+VIDEO_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+VIDEO_UPLOAD_MIN_CHUNK_SIZE = 1024 * 1024
+VIDEO_UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+VIDEO_UPLOAD_MAX_SIZE = 4 * 1024 * 1024 * 1024
+VIDEO_UPLOAD_SESSION_TIMEOUT = 24 * 60 * 60
+
+# course videos are stored once per distinct content (api.storage)
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    "videos": {"BACKEND": "api.storage.ContentAddressedStorage"},
+}
+
+# watch position heartbeats are buffered per process and written in one
+# batch every WATCH_FLUSH_INTERVAL seconds (or WATCH_BUFFER_MAX entries); a
+# video counts as completed past WATCH_COMPLETION_THRESHOLD of its duration
+WATCH_FLUSH_INTERVAL = 30
+WATCH_BUFFER_MAX = 10000
+WATCH_COMPLETION_THRESHOLD = 0.9
@@ -0,0 +1,110 @@
+import numpy as np
+from django.db.models import Count, Max
+
+from .cache import get_version, quiz_version_key, read_through
+from .models import AnswerAttempt, QuizAttempt
+
+# score distribution buckets, as a percentage of total marks
+SCORE_BINS = 10
+
+
+def item_statistics(correct, marks, answered=None):
+    """
+    p-value and corrected point-biserial of each question.
+
+    correct is an attempts x questions boolean matrix and marks the marks of
+    each question. answered masks the cells with an answer; the others (a
+    question added after the attempt) are left out of that question's
+    statistics rather than counted as wrong. The point-biserial of a
+    question correlates getting it right with the score on the other
+    questions, so an item doesn't discriminate merely by counting towards
+    the total. Undefined values (no answers, no variance) are nan.
+    """
+    if answered is None:
+        answered = np.ones(correct.shape, dtype=bool)
+    x = (correct & answered).astype(float)
+    weight = answered.astype(float)
+    totals = x @ marks
+    rest = totals[:, None] - x * marks[None, :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        count = weight.sum(axis=0)
+        p_values = x.sum(axis=0) / count
+        x_centered = (x - p_values) * weight
+        rest_centered = (rest - (rest * weight).sum(axis=0) / count) * weight
+        point_biserial = (x_centered * rest_centered).sum(axis=0) / np.sqrt(
+            (x_centered**2).sum(axis=0) * (rest_centered**2).sum(axis=0)
+        )
+    return p_values, point_biserial, totals
+
+
+def _number(value):
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def compute_quiz_statistics(quiz):
+    """
+    Item analysis and score statistics of the graded attempts of a quiz,
+    from one values_list query over their answers.
+    """
+    questions = list(quiz.questions.order_by("id").values_list("id", "question", "marks"))
+    rows = (
+        AnswerAttempt.objects.filter(quiz_attempt__quiz=quiz)
+        .exclude(quiz_attempt__qualified_status=QuizAttempt.QualifiedStatus.PENDING)
+        .values_list("quiz_attempt_id", "question_id", "is_correct", "quiz_attempt__qualified_status")
+    )
+    columns = list(zip(*rows))
+    statistics = {"quiz": quiz.id, "total_marks": quiz.total_marks, "attempts": 0}
+    if not columns or not questions:
+        return {**statistics, "questions": [{"id": q, "question": text, "marks": m} for q, text, m in questions]}
+
+    attempt_ids, question_ids, is_correct, qualified_status = (np.asarray(column) for column in columns)
+    attempts, attempt_index = np.unique(attempt_ids, return_inverse=True)
+    question_order = np.array([question_id for question_id, _, _ in questions])
+    question_index = np.searchsorted(question_order, question_ids)
+    correct = np.zeros((len(attempts), len(questions)), dtype=bool)
+    correct[attempt_index, question_index] = is_correct.astype(bool)
+    answered = np.zeros_like(correct)
+    answered[attempt_index, question_index] = True
+    marks = np.array([question_marks for _, _, question_marks in questions], dtype=float)
+
+    p_values, point_biserial, totals = item_statistics(correct, marks, answered)
+    passed = np.zeros(len(attempts), dtype=bool)
+    passed[attempt_index] = qualified_status == QuizAttempt.QualifiedStatus.PASSED
+    total_marks = marks.sum()
+    counts, edges = np.histogram(
+        totals / total_marks * 100 if total_marks else np.zeros(len(attempts)),
+        bins=SCORE_BINS,
+        range=(0, 100),
+    )
+    return {
+        **statistics,
+        "attempts": len(attempts),
+        "pass_rate": _number(passed.mean()),
+        "mean_score": _number(totals.mean()),
+        "median_score": _number(np.median(totals)),
+        "std_score": _number(totals.std()),
+        "score_distribution": [
+            {"from": int(edges[i]), "to": int(edges[i + 1]), "count": int(count)} for i, count in enumerate(counts)
+        ],
+        "questions": [
+            {
+                "id": question_id,
+                "question": text,
+                "marks": question_marks,
+                "p_value": _number(p_values[i]),
+                "point_biserial": _number(point_biserial[i]),
+            }
+            for i, (question_id, text, question_marks) in enumerate(questions)
+        ],
+    }
+
+
+def get_quiz_statistics(quiz):
+    # keyed by the attempts' count and latest change, so a new attempt or any
+    # grading (which touches updated_at) moves to a fresh entry, and by the
+    # quiz version for question changes
+    state = QuizAttempt.objects.filter(quiz=quiz).aggregate(count=Count("id"), changed=Max("updated_at"))
+    changed = state["changed"].timestamp() if state["changed"] else 0
+    version = get_version(quiz_version_key(quiz.id))
+    key = f"quiz:{quiz.id}:{version}:statistics:{state['count']}:{changed}"
+    return read_through(key, lambda: compute_quiz_statistics(quiz), namespace="quiz")
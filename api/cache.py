@@ -0,0 +1,146 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Cached course payloads are keyed by a version token. Changing data only
+# replaces the token (see api/signals.py), so stale entries are never read
+# again and simply age out. Tokens are random rather than counters so an
+# evicted version key can't bring an old entry back.
+CATALOG_VERSION_KEY = "course:catalog:version"
+
+
+def get_cache():
+    return caches[getattr(settings, "COURSE_CACHE_ALIAS", "default")]
+
+
+def cache_timeout():
+    return getattr(settings, "COURSE_CACHE_TIMEOUT", 60 * 60)
+
+
+def course_version_key(course_id):
+    return f"course:{course_id}:version"
+
+
+def get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    get_cache().set(key, uuid.uuid4().hex, None)
+
+
+def invalidate_course(course_id):
+    bump_version(course_version_key(course_id))
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def membership_version_key(course_id):
+    return f"course:{course_id}:members:version"
+
+
+def invalidate_course_membership(course_id):
+    bump_version(membership_version_key(course_id))
+
+
+def get_course_membership(course_id, user_id, build):
+    # short lived: a missed invalidation can only outlive the change by this long
+    version = get_version(membership_version_key(course_id))
+    key = f"course:{course_id}:members:{version}:{user_id}"
+    cache = get_cache()
+    membership = cache.get(key)
+    if membership is None:
+        membership = build()
+        cache.set(key, membership, getattr(settings, "COURSE_MEMBERSHIP_TIMEOUT", 60))
+    return membership
+
+
+def count(name, namespace="course"):
+    cache = get_cache()
+    key = f"{namespace}:cache:{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def get_stats(namespace="course"):
+    cache = get_cache()
+    return {
+        "hits": cache.get(f"{namespace}:cache:hits", 0),
+        "misses": cache.get(f"{namespace}:cache:misses", 0),
+    }
+
+
+def read_through(key, build, namespace="course"):
+    # hits and misses are counted per namespace, so each cache's stats stand alone
+    cache = get_cache()
+    data = cache.get(key)
+    if data is not None:
+        count("hits", namespace)
+        return data
+    count("misses", namespace)
+    data = build()
+    cache.set(key, data, cache_timeout())
+    return data
+
+
+def get_course_detail(course_id, build):
+    version = get_version(course_version_key(course_id))
+    return read_through(f"course:{course_id}:{version}:detail", build)
+
+
+def get_course_listing(request, build):
+    # query strings (search, limit, cursor, ...) each get their own entry
+    version = get_version(CATALOG_VERSION_KEY)
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return read_through(f"course:catalog:{version}:{url}", build)
+
+
+def quiz_version_key(quiz_id):
+    return f"quiz:{quiz_id}:version"
+
+
+def invalidate_quiz(quiz_id):
+    bump_version(quiz_version_key(quiz_id))
+
+
+def get_quiz_payload(quiz_id, build):
+    # (course id, rendered JSON bytes) of the student facing quiz, so a hit
+    # needs neither the database nor a serializer
+    version = get_version(quiz_version_key(quiz_id))
+    return read_through(f"quiz:{quiz_id}:{version}:payload", build, namespace="quiz")
+
+
+def video_meta_key(video_id):
+    return f"video:{video_id}:meta"
+
+
+def invalidate_video_meta(video_id):
+    get_cache().delete(video_meta_key(video_id))
+
+
+def get_video_meta(video_id, build):
+    # (course id, duration) of a video, read on every playback heartbeat;
+    # dropped by the CourseVideo signals
+    return read_through(video_meta_key(video_id), build, namespace="video")
+
+
+def watch_position_key(student_id, video_id):
+    return f"video:{video_id}:position:{student_id}"
+
+
+def set_watch_position(student_id, video_id, position):
+    # the latest heartbeat, readable from every process before it is flushed
+    get_cache().set(watch_position_key(student_id, video_id), position, cache_timeout())
+
+
+def get_watch_position(student_id, video_id):
+    return get_cache().get(watch_position_key(student_id, video_id))
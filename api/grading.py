@@ -0,0 +1,189 @@
+import json
+
+import numpy as np
+from django.db.models import FloatField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce, Round
+from django.utils import timezone
+
+from .models import Answer, AnswerAttempt, Question, Quiz, QuizAttempt
+
+QuestionType = Question.QuestionType
+OBJECTIVE_TYPES = [QuestionType.TRUE_FALSE, QuestionType.SINGLE_OPTION, QuestionType.MULTIPLE_CHOICE]
+# one bit per option; the top bit marks an answer that is not an option
+MAX_OPTIONS = 63
+UNKNOWN_OPTION = 1 << MAX_OPTIONS
+PASSING_PERCENTAGE = 70
+TRUE_ANSWERS = {"true", "t", "yes", "y", "1"}
+FALSE_ANSWERS = {"false", "f", "no", "n", "0"}
+
+
+def recompute_quiz_totals(quiz_id):
+    """
+    Set total_marks and passing_marks of a quiz from its questions with one
+    UPDATE. A quiz without questions gets zeros.
+    """
+    total = Coalesce(
+        Subquery(
+            Question.objects.filter(quiz=OuterRef("pk"))
+            .order_by()
+            .values("quiz")
+            .annotate(total=Sum("marks"))
+            .values("total")
+        ),
+        0,
+    )
+    Quiz.objects.filter(id=quiz_id).update(
+        # in float: integer division would truncate on Postgres
+        total_marks=total,
+        passing_marks=Round(Cast(total, FloatField()) * PASSING_PERCENTAGE / 100),
+    )
+
+
+def recompute_quiz_attempt_scores(quiz_attempt_ids):
+    """
+    Recompute marks_obtained and qualified_status of the given attempts
+    from one grouped aggregate over their correct answers, and save them
+    with one bulk_update. Returns the updated attempts by id.
+    """
+    marks = dict(
+        AnswerAttempt.objects.filter(quiz_attempt_id__in=quiz_attempt_ids, is_correct=True)
+        .order_by()
+        .values("quiz_attempt")
+        .annotate(marks=Sum("question__marks"))
+        .values_list("quiz_attempt", "marks")
+    )
+    attempts = list(
+        QuizAttempt.objects.filter(id__in=quiz_attempt_ids)
+        .select_related("quiz")
+        .only("id", "marks_obtained", "qualified_status", "updated_at", "quiz__passing_marks")
+    )
+    now = timezone.now()
+    for attempt in attempts:
+        attempt.marks_obtained = marks.get(attempt.id, 0)
+        if attempt.marks_obtained >= attempt.quiz.passing_marks:
+            attempt.qualified_status = QuizAttempt.QualifiedStatus.PASSED
+        else:
+            attempt.qualified_status = QuizAttempt.QualifiedStatus.FAILED
+        attempt.updated_at = now
+    QuizAttempt.objects.bulk_update(attempts, ["marks_obtained", "qualified_status", "updated_at"])
+    return {attempt.id: attempt for attempt in attempts}
+
+
+def normalize_answer(text, question_type):
+    text = " ".join(str(text).lower().split())
+    if question_type == QuestionType.TRUE_FALSE:
+        if text in TRUE_ANSWERS:
+            return "true"
+        if text in FALSE_ANSWERS:
+            return "false"
+    return text
+
+
+def split_answer(answer, question_type):
+    """The normalized options picked by a submitted answer."""
+    # multiple choice answers are stored as a JSON list of option texts
+    if question_type == QuestionType.MULTIPLE_CHOICE and answer.startswith("["):
+        try:
+            choices = json.loads(answer)
+        except ValueError:
+            choices = [answer]
+    else:
+        choices = [answer]
+    return {normalize_answer(choice, question_type) for choice in choices if str(choice).strip()}
+
+
+class AnswerKey:
+    """
+    Answer keys of many questions as bitmasks: every option of a question
+    gets a bit and the key is the mask of its correct options. Questions
+    without a correct option have no key and are left to the instructor.
+    """
+
+    def __init__(self, options):
+        # options: (question_id, question_type, answer, is_correct) rows
+        self.types = {}
+        self.bits = {}  # (question_id, normalized option) -> bit
+        option_counts = {}
+        keys = {}
+        for question_id, question_type, answer, is_correct in options:
+            self.types[question_id] = question_type
+            option = (question_id, normalize_answer(answer, question_type))
+            if option not in self.bits:
+                self.bits[option] = 1 << option_counts.get(question_id, 0)
+                option_counts[question_id] = option_counts.get(question_id, 0) + 1
+            if is_correct:
+                keys[question_id] = keys.get(question_id, 0) | self.bits[option]
+        keys = sorted(
+            (question_id, mask) for question_id, mask in keys.items() if option_counts[question_id] <= MAX_OPTIONS
+        )
+        # sorted by question id, so a question's key is found with searchsorted
+        self.question_ids = np.array([question_id for question_id, _ in keys], dtype=np.int64)
+        self.masks = np.array([mask for _, mask in keys], dtype=np.uint64)
+        self.keyed = set(self.question_ids.tolist())
+
+    def __contains__(self, question_id):
+        return question_id in self.keyed
+
+    def encode(self, question_id, answer):
+        mask = 0
+        for choice in split_answer(answer, self.types[question_id]):
+            mask |= self.bits.get((question_id, choice), UNKNOWN_OPTION)
+        return mask
+
+
+def grade_answers(key, question_ids, answers):
+    """
+    Whether each answer matches its question's key, for questions in the
+    key. Each distinct (question, answer) pair is encoded once, then all
+    answers are compared against their keys as arrays in one operation.
+    """
+    codes = {}  # distinct (question_id, answer) -> index into encoded
+    encoded = []
+    indices = np.empty(len(answers), dtype=np.intp)
+    for i, pair in enumerate(zip(question_ids, answers)):
+        code = codes.get(pair)
+        if code is None:
+            code = codes[pair] = len(encoded)
+            encoded.append(key.encode(*pair))
+        indices[i] = code
+    submitted = np.array(encoded, dtype=np.uint64)[indices]
+    positions = np.searchsorted(key.question_ids, np.asarray(question_ids))
+    return submitted == key.masks[positions]
+
+
+def auto_grade_quiz_attempts(quiz_attempt_ids):
+    """
+    Grade the objective answers of the given attempts against their answer
+    keys. Attempts made only of auto-graded questions are scored right away;
+    the rest keep their status until an instructor grades the remaining
+    answers. Returns the scored attempts by id.
+    """
+    rows = list(
+        AnswerAttempt.objects.filter(quiz_attempt_id__in=quiz_attempt_ids).values_list(
+            "id", "quiz_attempt_id", "question_id", "question__question_type", "answer", "is_correct"
+        )
+    )
+    objective = {row[2] for row in rows if row[3] in OBJECTIVE_TYPES}
+    key = AnswerKey(
+        Answer.objects.filter(question_id__in=objective).values_list(
+            "question_id", "question__question_type", "answer", "is_correct"
+        )
+    )
+    graded = [row for row in rows if row[2] in key]
+    manual = {row[1] for row in rows if row[2] not in key}
+
+    now = timezone.now()
+    changed = []
+    if graded:
+        correct = grade_answers(key, [row[2] for row in graded], [row[4] for row in graded])
+        changed = [
+            AnswerAttempt(id=row[0], is_correct=is_correct, updated_at=now)
+            for row, is_correct in zip(graded, correct.tolist())
+            if row[5] != is_correct
+        ]
+    AnswerAttempt.objects.bulk_update(changed, ["is_correct", "updated_at"], batch_size=1000)
+
+    scored = {row[1] for row in rows} - manual
+    if not scored:
+        return {}
+    return recompute_quiz_attempt_scores(scored)
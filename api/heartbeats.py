@@ -0,0 +1,163 @@
+"""
+Playback heartbeats: players report their position every few seconds, far
+too often for a write each. Positions are kept in a per-process buffer where
+a student's repeated reports on a video overwrite each other, and a
+background thread writes the buffer to the database as one batch every
+WATCH_FLUSH_INTERVAL seconds (sooner if it fills up to WATCH_BUFFER_MAX
+entries). The write rate therefore follows the number of processes, not of
+viewers. The latest position also goes to the cache, so any process can
+answer a resume before the flush. A crash loses at most one interval of
+positions, which the next heartbeats report again anyway.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .cache import set_watch_position
+from .models import CourseProgressTracking, CourseVideo, VideoWatchPosition
+
+logger = logging.getLogger(__name__)
+
+
+def completion_threshold():
+    return getattr(settings, "WATCH_COMPLETION_THRESHOLD", 0.9)
+
+
+class WatchPositionBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.positions = {}
+        self.completions = set()
+        self.last_flush = time.monotonic()
+        self.thread = None
+
+    def __len__(self):
+        return len(self.positions)
+
+    def record(self, student_id, video_id, course_id, duration, position):
+        """Buffer one heartbeat, flushing the buffer if it is due."""
+        if duration:
+            position = min(position, duration)
+        set_watch_position(student_id, video_id, position)
+        self.start()
+        with self.lock:
+            self.positions[student_id, video_id] = position
+            if duration and position >= duration * completion_threshold():
+                self.completions.add((student_id, course_id, video_id))
+            due = (
+                len(self.positions) >= getattr(settings, "WATCH_BUFFER_MAX", 10000)
+                or time.monotonic() - self.last_flush >= getattr(settings, "WATCH_FLUSH_INTERVAL", 30)
+            )
+        if due:
+            self.flush()
+
+    def start(self):
+        # started by the first heartbeat, so commands and migrations that
+        # import this module don't get a thread
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name="watch-position-flush", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            interval = getattr(settings, "WATCH_FLUSH_INTERVAL", 30)
+            time.sleep(max(self.last_flush + interval - time.monotonic(), 1))
+            if time.monotonic() - self.last_flush >= getattr(settings, "WATCH_FLUSH_INTERVAL", 30):
+                try:
+                    self.flush()
+                finally:
+                    # this thread's connection is never closed by a request
+                    close_old_connections()
+
+    def take(self):
+        with self.lock:
+            positions, completions = self.positions, self.completions
+            self.positions, self.completions = {}, set()
+            self.last_flush = time.monotonic()
+        return positions, completions
+
+    def flush(self):
+        """Write the buffered positions and completions; returns how many positions."""
+        positions, completions = self.take()
+        if not positions and not completions:
+            return 0
+        try:
+            write_watch_positions(positions, completions)
+            return len(positions)
+        except Exception:
+            logger.exception("Could not flush %d watch positions, writing them one by one", len(positions))
+        # never put a failed batch back: one bad row would fail every later
+        # flush. Rows that fail on their own are dropped; the next heartbeat
+        # of that player reports its position again
+        written = 0
+        for (student_id, video_id), position in positions.items():
+            try:
+                write_watch_positions(
+                    {(student_id, video_id): position},
+                    {completion for completion in completions if completion[::2] == (student_id, video_id)},
+                )
+                written += 1
+            except Exception:
+                logger.exception("Dropped watch position of student %s in video %s", student_id, video_id)
+        return written
+
+
+def write_watch_positions(positions, completions):
+    """
+    Upsert {(student id, video id): position} and mark the (student id,
+    course id, video id) completions, in a fixed number of statements
+    whatever the batch size.
+    """
+    # a video deleted since its heartbeats would fail the whole batch
+    video_ids = set(CourseVideo.objects.filter(id__in={video_id for _, video_id in positions}).values_list("id", flat=True))
+    positions = {key: position for key, position in positions.items() if key[1] in video_ids}
+    completions = {completion for completion in completions if completion[2] in video_ids}
+    with transaction.atomic():
+        VideoWatchPosition.objects.bulk_create(
+            [
+                VideoWatchPosition(student_id=student_id, video_id=video_id, position=position)
+                for (student_id, video_id), position in positions.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["student", "video"],
+            update_fields=["position", "updated_at"],
+        )
+        if completions:
+            mark_completed(completions)
+
+
+def mark_completed(completions):
+    # the through rows are inserted directly (no m2m_changed), so the
+    # completed_count of the progress rows touched is recounted afterwards
+    pairs = {(student_id, course_id) for student_id, course_id, _ in completions}
+    CourseProgressTracking.objects.bulk_create(
+        [CourseProgressTracking(student_id=student_id, course_id=course_id) for student_id, course_id in pairs],
+        ignore_conflicts=True,
+    )
+    progress_ids = {
+        (student_id, course_id): progress_id
+        for progress_id, student_id, course_id in CourseProgressTracking.objects.filter(
+            student_id__in={student_id for student_id, _ in pairs},
+            course_id__in={course_id for _, course_id in pairs},
+        ).values_list("id", "student_id", "course_id")
+        if (student_id, course_id) in pairs
+    }
+    through = CourseProgressTracking.completed_videos.through
+    through.objects.bulk_create(
+        [
+            through(courseprogresstracking_id=progress_ids[student_id, course_id], coursevideo_id=video_id)
+            for student_id, course_id, video_id in completions
+        ],
+        ignore_conflicts=True,
+    )
+    CourseProgressTracking.objects.filter(id__in=progress_ids.values()).recount_completed()
+
+
+watch_positions = WatchPositionBuffer()
+atexit.register(watch_positions.flush)
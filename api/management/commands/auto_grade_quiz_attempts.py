@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.grading import auto_grade_quiz_attempts
+from api.models import QuizAttempt
+
+
+class Command(BaseCommand):
+    help = "Auto-grade the objective answers of pending quiz attempts (e.g. after answer keys change)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quiz", type=int, help="only attempts of this quiz")
+        parser.add_argument("--all", action="store_true", help="regrade graded attempts too")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        attempts = QuizAttempt.objects.order_by("id")
+        if options["quiz"]:
+            attempts = attempts.filter(quiz=options["quiz"])
+        if not options["all"]:
+            attempts = attempts.filter(qualified_status=QuizAttempt.QualifiedStatus.PENDING)
+        attempt_ids = list(attempts.values_list("id", flat=True))
+
+        scored = 0
+        batch_size = options["batch_size"]
+        for i in range(0, len(attempt_ids), batch_size):
+            scored += len(auto_grade_quiz_attempts(attempt_ids[i : i + batch_size]))
+        self.stdout.write(
+            f"Graded {len(attempt_ids)} attempts, {scored} fully scored, "
+            f"{len(attempt_ids) - scored} waiting for an instructor"
+        )
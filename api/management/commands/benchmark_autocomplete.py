@@ -0,0 +1,55 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from faker import Faker
+
+from api.models import Course
+from api.search import CourseNameIndex
+
+
+class Command(BaseCommand):
+    help = "Time course name autocomplete on a synthetic catalog (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=100000)
+        parser.add_argument("--queries", type=int, default=1000)
+        parser.add_argument("--limit", type=int, default=10)
+
+    def handle(self, *args, **options):
+        faker = Faker()
+        Faker.seed(0)
+        random.seed(0)
+        with transaction.atomic():
+            Course.objects.bulk_create(
+                [
+                    Course(name=faker.sentence(nb_words=4), description="")
+                    for _ in range(options["courses"])
+                ],
+                batch_size=1000,
+            )
+            index = CourseNameIndex()
+            start = time.perf_counter()
+            index.build()
+            build = time.perf_counter() - start
+
+            # what a user has typed so far: the first 1-4 letters of a word
+            prefixes = [
+                faker.word()[: random.randint(1, 4)] for _ in range(options["queries"])
+            ]
+            timings = []
+            for prefix in prefixes:
+                start = time.perf_counter()
+                index.complete(prefix, options["limit"])
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"build {build:.2f}s for {options['courses']} courses, "
+                f"mean {statistics.mean(timings):.3f}ms, "
+                f"p50 {timings[len(timings) // 2]:.3f}ms, "
+                f"p99 {timings[int(len(timings) * 0.99)]:.3f}ms "
+                f"over {len(prefixes)} prefixes"
+            )
+            transaction.set_rollback(True)
@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.grading import AnswerKey, grade_answers, split_answer
+from api.models import Question
+
+QuestionType = Question.QuestionType
+
+
+def grade_one_by_one(correct_options, question_ids, answers, types):
+    # per answer set comparison, as a Python loop would grade them
+    return [
+        split_answer(answer, types[question_id]) == correct_options[question_id]
+        for question_id, answer in zip(question_ids, answers)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Measure auto-grading throughput on synthetic quiz attempts (in memory, no database)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--attempts", type=int, default=100_000)
+        parser.add_argument("--questions", type=int, default=10, help="questions per attempt")
+        parser.add_argument("--options", type=int, default=4, help="options per choice question")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        questions, option_count = options["questions"], options["options"]
+        types, rows, correct_options, question_options = {}, [], {}, {}
+        for question_id in range(questions):
+            question_type = [QuestionType.TRUE_FALSE, QuestionType.SINGLE_OPTION, QuestionType.MULTIPLE_CHOICE][question_id % 3]
+            texts = ["true", "false"] if question_type == QuestionType.TRUE_FALSE else [f"option {i}" for i in range(option_count)]
+            picks = rng.sample(texts, 2 if question_type == QuestionType.MULTIPLE_CHOICE else 1)
+            types[question_id] = question_type
+            question_options[question_id] = texts
+            correct_options[question_id] = set(picks)
+            rows.extend((question_id, question_type, text, text in picks) for text in texts)
+
+        question_ids, answers = [], []
+        for _ in range(options["attempts"]):
+            for question_id in range(questions):
+                picks = rng.sample(question_options[question_id], 2 if types[question_id] == QuestionType.MULTIPLE_CHOICE else 1)
+                question_ids.append(question_id)
+                answers.append(f'["{picks[0]}", "{picks[1]}"]' if len(picks) == 2 else picks[0].upper())
+
+        start = time.perf_counter()
+        expected = grade_one_by_one(correct_options, question_ids, answers, types)
+        loop = time.perf_counter() - start
+
+        start = time.perf_counter()
+        key = AnswerKey(rows)
+        encoded = time.perf_counter()
+        correct = grade_answers(key, question_ids, answers)
+        vectorized = time.perf_counter() - start
+
+        mismatches = sum(got != want for got, want in zip(correct.tolist(), expected)) + abs(len(correct) - len(expected))
+        if mismatches:
+            raise CommandError(f"The vectorized grader disagrees with the one by one grader on {mismatches} answers")
+        self.stdout.write(
+            f"{options['attempts']} attempts x {questions} questions ({len(answers)} answers)\n"
+            f"one by one: {loop:.2f}s ({len(answers) / loop:.0f} answers/s)\n"
+            f"vectorized: {vectorized:.2f}s ({len(answers) / vectorized:.0f} answers/s, "
+            f"key built in {(encoded - start) * 1000:.1f}ms)"
+        )
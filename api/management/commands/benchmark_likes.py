@@ -0,0 +1,75 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+
+from api.models import Course, CourseLikeCounter
+
+# the scratch course the benchmark writes to; nothing else is touched
+SCRATCH_COURSE = "__benchmark_likes__"
+
+
+def locked_increment(course_id):
+    # the previous AddLike receiver: lock the course row and rewrite it
+    with transaction.atomic():
+        course = Course.objects.select_for_update().get(id=course_id)
+        course.likes += 1
+        course.save()
+
+
+def sharded_increment(course_id):
+    CourseLikeCounter.add(course_id, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure likes/sec on a single hot course with concurrent writers. The writers need "
+        "committed rows, so it can't run in a rolled back transaction: it writes to a scratch "
+        "course, deleted afterwards, and only runs with DEBUG or --force"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--likes", type=int, default=200, help="likes per thread")
+        parser.add_argument("--force", action="store_true", help="run even though DEBUG is off")
+
+    def run(self, increment, course_id, threads, likes):
+        # lock errors (e.g. "database is locked" on SQLite) are counted, not retried
+        failures = []
+
+        def worker():
+            try:
+                for _ in range(likes):
+                    try:
+                        increment(course_id)
+                    except OperationalError:
+                        failures.append(1)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return (threads * likes - len(failures)) / elapsed, len(failures)
+
+    def handle(self, *args, **options):
+        if not (settings.DEBUG or options["force"]):
+            raise CommandError("This benchmark writes to the configured database; pass --force to run it anyway")
+        threads, likes = options["threads"], options["likes"]
+        # left over by a run that was killed
+        Course.all_objects.filter(name=SCRATCH_COURSE).delete()
+        course = Course.objects.create(name=SCRATCH_COURSE, description="")
+        try:
+            for label, increment in [("select_for_update", locked_increment), ("sharded", sharded_increment)]:
+                rate, failed = self.run(increment, course.id, threads, likes)
+                self.stdout.write(
+                    f"{label}: {rate:.0f} likes/s with {threads} threads on one course, {failed} failed"
+                )
+        finally:
+            Course.all_objects.filter(id=course.id).delete()
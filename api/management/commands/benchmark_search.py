@@ -0,0 +1,61 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from faker import Faker
+
+from api.models import Course
+from api.search import InvertedIndexSearchBackend, PostgresSearchBackend
+
+
+class Command(BaseCommand):
+    help = "Compare course search backends on a synthetic catalog (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=10000)
+        parser.add_argument("--queries", type=int, default=200)
+        parser.add_argument("--limit", type=int, default=20)
+
+    def handle(self, *args, **options):
+        faker = Faker()
+        Faker.seed(0)
+        random.seed(0)
+        with transaction.atomic():
+            Course.objects.bulk_create(
+                [
+                    Course(name=faker.sentence(nb_words=4), description=faker.paragraph(nb_sentences=5))
+                    for _ in range(options["courses"])
+                ],
+                batch_size=1000,
+            )
+            queries = [" ".join(faker.words(nb=random.randint(1, 3))) for _ in range(options["queries"])]
+
+            backends = [("inverted index", InvertedIndexSearchBackend())]
+            if connection.vendor == "postgresql":
+                backends.append(("postgres", PostgresSearchBackend()))
+
+            for label, backend in backends:
+                start = time.perf_counter()
+                if isinstance(backend, PostgresSearchBackend):
+                    for course in Course.objects.filter(search_vector__isnull=True).only("id"):
+                        backend.index(course)
+                else:
+                    backend.build()
+                build = time.perf_counter() - start
+
+                timings = []
+                for query in queries:
+                    start = time.perf_counter()
+                    list(backend.search(query, options["limit"]).values_list("id", flat=True))
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                self.stdout.write(
+                    f"{label}: index {build:.2f}s, "
+                    f"mean {statistics.mean(timings):.2f}ms, "
+                    f"p50 {timings[len(timings) // 2]:.2f}ms, "
+                    f"p95 {timings[int(len(timings) * 0.95)]:.2f}ms "
+                    f"over {len(queries)} queries"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,39 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import VideoUploadSession
+from api.storage import video_storage
+
+
+class Command(BaseCommand):
+    help = "Remove video upload sessions (and their temp files) untouched for VIDEO_UPLOAD_SESSION_TIMEOUT, and orphaned video files (run e.g. hourly)"
+
+    def handle(self, *args, **options):
+        timeout = settings.VIDEO_UPLOAD_SESSION_TIMEOUT
+        sessions = VideoUploadSession.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=timeout))
+        removed = 0
+        for session in sessions.iterator():
+            session.discard()
+            removed += 1
+
+        # temp files left behind without a session (e.g. a crash between the two)
+        orphans = 0
+        if os.path.isdir(settings.VIDEO_UPLOAD_TEMP_DIR):
+            live = {str(session_id) for session_id in VideoUploadSession.objects.values_list("id", flat=True)}
+            for entry in os.scandir(settings.VIDEO_UPLOAD_TEMP_DIR):
+                session_id = entry.name.removesuffix(".part")
+                if session_id not in live and entry.stat().st_mtime < time.time() - timeout:
+                    os.remove(entry.path)
+                    orphans += 1
+
+        # stored video files no row references (see ContentAddressedStorage.remove_orphans)
+        storage = video_storage()
+        blobs = storage.remove_orphans(time.time() - timeout) if hasattr(storage, "remove_orphans") else 0
+        self.stdout.write(
+            f"Removed {removed} abandoned uploads, {orphans} orphaned temp files and {blobs} orphaned video files"
+        )
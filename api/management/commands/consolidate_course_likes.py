@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import invalidate_course
+from api.models import CourseLikeCounter
+
+
+class Command(BaseCommand):
+    # Course.likes, what the API shows, lags new likes until this runs
+    help = "Fold pending like counter shards into Course.likes (run periodically, e.g. every minute)"
+
+    def handle(self, *args, **options):
+        course_ids = CourseLikeCounter.consolidate()
+        for course_id in course_ids:
+            invalidate_course(course_id)
+        self.stdout.write(f"Consolidated likes of {len(course_ids)} courses")
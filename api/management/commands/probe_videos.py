@@ -0,0 +1,46 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from api.models import CourseVideo
+from api.probe import ProbeError, probe_path
+
+
+def probe_video(item):
+    # runs in a worker process: plain data in and out, no ORM
+    video_id, path = item
+    try:
+        return video_id, probe_path(path)
+    except (ProbeError, OSError):
+        return video_id, None
+
+
+class Command(BaseCommand):
+    help = "Record duration, resolution and bitrate of videos that have none, probing files in a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="defaults to the number of CPUs")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--all", action="store_true", help="probe videos that already have a duration too")
+
+    def handle(self, *args, **options):
+        videos = CourseVideo.objects.order_by("id")
+        if not options["all"]:
+            videos = videos.filter(duration__isnull=True)
+        items = [(video.id, video.video.path) for video in videos.only("id", "video")]
+
+        probed = failed = 0
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            batch = []
+            for video_id, info in pool.map(probe_video, items, chunksize=16):
+                if info is None:
+                    failed += 1
+                    continue
+                batch.append(CourseVideo(id=video_id, **info._asdict()))
+                if len(batch) >= options["batch_size"]:
+                    CourseVideo.objects.bulk_update(batch, ["duration", "width", "height", "bitrate"])
+                    probed += len(batch)
+                    batch = []
+            CourseVideo.objects.bulk_update(batch, ["duration", "width", "height", "bitrate"])
+            probed += len(batch)
+        self.stdout.write(f"Probed {probed} videos, {failed} could not be read")
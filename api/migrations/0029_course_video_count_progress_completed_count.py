@@ -0,0 +1,53 @@
+# Generated by Django 5.1.3 on 2026-10-17 07:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    Course = apps.get_model("api", "Course")
+    CourseVideo = apps.get_model("api", "CourseVideo")
+    CourseProgressTracking = apps.get_model("api", "CourseProgressTracking")
+    Through = CourseProgressTracking.completed_videos.through
+
+    video_count = (
+        CourseVideo.objects.filter(course=OuterRef("pk"))
+        .order_by()
+        .values("course")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    Course.objects.update(video_count=Coalesce(Subquery(video_count), 0))
+
+    completed_count = (
+        Through.objects.filter(courseprogresstracking=OuterRef("pk"))
+        .order_by()
+        .values("courseprogresstracking")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    CourseProgressTracking.objects.update(
+        completed_count=Coalesce(Subquery(completed_count), 0)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0028_rename_coursecomments_coursecomment_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="video_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="courseprogresstracking",
+            name="completed_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.3 on 2026-10-17 07:05
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+INDEX = django.contrib.postgres.indexes.GinIndex(
+    fields=["search_vector"], name="course_search_vector_gin"
+)
+
+
+# tsvector and GIN only exist on PostgreSQL; other backends keep the
+# nullable column unused
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Course = apps.get_model("api", "Course")
+    schema_editor.add_index(Course, INDEX)
+    Course.objects.update(
+        search_vector=SearchVector("name", weight="A")
+        + SearchVector("description", weight="B")
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.remove_index(apps.get_model("api", "Course"), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0029_course_video_count_progress_completed_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name="course", index=INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_search_index, drop_search_index),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-17 07:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0030_course_search_vector"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourseLikeCounter",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("shard", models.PositiveSmallIntegerField()),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "course",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="like_shards",
+                        to="api.course",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("course", "shard")},
+            },
+        ),
+    ]
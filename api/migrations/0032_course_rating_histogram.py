@@ -0,0 +1,69 @@
+# Generated by Django 5.1.3 on 2026-10-17 07:13
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Course = apps.get_model("api", "Course")
+    CourseRating = apps.get_model("api", "CourseRating")
+
+    # recomputed exactly from the rating rows, replacing the float estimates
+    Course.objects.update(total_ratings=0, rating=0.0)
+    aggregates = (
+        CourseRating.objects.order_by()
+        .values("course")
+        .annotate(
+            total=Count("id"),
+            sum=Sum("rating"),
+            **{f"stars_{i}": Count("id", filter=Q(rating=i)) for i in range(1, 6)},
+        )
+    )
+    for row in aggregates:
+        Course.objects.filter(id=row["course"]).update(
+            total_ratings=row["total"],
+            rating_sum=row["sum"],
+            rating=row["sum"] / row["total"],
+            **{f"rating_{i}_count": row[f"stars_{i}"] for i in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0031_courselikecounter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="course",
+            name="rating_1_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="rating_2_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="rating_3_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="rating_4_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="rating_5_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="course",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-17 07:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0032_course_rating_histogram"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="question_type",
+            field=models.CharField(
+                choices=[
+                    ("TF", "True/False"),
+                    ("MCQ", "Multiple Choice"),
+                    ("OPTION", "Single Option"),
+                    ("Text", "Text"),
+                ],
+                default="Text",
+                max_length=20,
+            ),
+        ),
+        migrations.CreateModel(
+            name="Answer",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("answer", models.TextField()),
+                ("is_correct", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "question",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="options",
+                        to="api.question",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("question", "answer")},
+            },
+        ),
+    ]
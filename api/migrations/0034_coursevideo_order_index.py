@@ -0,0 +1,23 @@
+# Generated by Django 5.1.3 on 2026-10-17 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0033_question_type_answer"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="coursevideo",
+            options={"ordering": ["order"]},
+        ),
+        migrations.AddIndex(
+            model_name="coursevideo",
+            index=models.Index(
+                fields=["course", "order"], name="coursevideo_course_order_idx"
+            ),
+        ),
+    ]
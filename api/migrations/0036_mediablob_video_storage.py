@@ -0,0 +1,31 @@
+# Generated by Django 5.1.3 on 2026-10-17 07:44
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0035_videouploadsession"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaBlob",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("size", models.PositiveBigIntegerField()),
+                ("references", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="coursevideo",
+            name="video",
+            field=models.FileField(
+                storage=api.storage.video_storage, upload_to="videos/"
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.3 on 2026-10-17 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0036_mediablob_video_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="coursevideo",
+            name="bitrate",
+            field=models.PositiveIntegerField(
+                blank=True, help_text="bits per second", null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="coursevideo",
+            name="duration",
+            field=models.FloatField(blank=True, help_text="seconds", null=True),
+        ),
+        migrations.AddField(
+            model_name="coursevideo",
+            name="height",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="coursevideo",
+            name="width",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
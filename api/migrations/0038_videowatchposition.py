@@ -0,0 +1,42 @@
+# Generated by Django 5.1.3 on 2026-10-17 07:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0037_coursevideo_probe"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VideoWatchPosition",
+            fields=[
+                ("id", models.AutoField(primary_key=True, serialize=False)),
+                ("position", models.FloatField(help_text="seconds")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "student",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="watch_positions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "video",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="watch_positions",
+                        to="api.coursevideo",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("student", "video")},
+            },
+        ),
+    ]
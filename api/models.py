@@ -1,8 +1,19 @@
-from django.db import models
+import os
+import random
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.models import Group, Permission
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from .probe import ProbeError, probe
+from .storage import video_storage
+
 class Role(models.TextChoices):
     STUDENT = "student", "Student"
     INSTRUCTOR = "instructor", "Instructor"
@@ -25,9 +36,17 @@ class CourseQuerySet(models.QuerySet):
     def active(self):
         return self.filter(is_deleted=False)
 
-class CourseManager(models.Manager):
+    def for_listing(self):
+        # instructors and comments are loaded once for the whole queryset
+        # so serializing N courses costs the same as serializing one
+        return self.prefetch_related(
+            models.Prefetch("instructors", queryset=User.objects.only("id", "username")),
+            models.Prefetch("coursecomment_set", queryset=CourseComment.objects.select_related("user")),
+        )
+
+class CourseManager(models.Manager.from_queryset(CourseQuerySet)):
     def get_queryset(self):
-        return CourseQuerySet(self.model, using=self._db).active()
+        return super().get_queryset().active()
 
 
 class Course(models.Model):
@@ -38,13 +57,25 @@ class Course(models.Model):
     likes = models.PositiveIntegerField(default=0)
     total_ratings = models.PositiveIntegerField(default=0) #count
     rating = models.FloatField(default=0.0) #average
+    rating_sum = models.PositiveIntegerField(default=0)
+    #star histogram; counts, sum and average are maintained by signals
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    video_count = models.PositiveIntegerField(default=0) #maintained by signals
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True,blank=True)
+    search_vector = SearchVectorField(null=True, editable=False) #maintained by signals
 
     #managers
     objects = CourseManager()
     all_objects = models.Manager()
 
+    class Meta:
+        indexes = [GinIndex(fields=["search_vector"], name="course_search_vector_gin")]
+
     def __str__(self):
         return self.name
     
@@ -53,7 +84,18 @@ class Course(models.Model):
         self.deleted_at = timezone.now()
         self.save()
 
-   
+
+class EnrollmentQuerySet(models.QuerySet):
+    def for_listing(self):
+        # a single joined query carrying only the columns the listing renders
+        return self.select_related("student", "instructor", "course").only(
+            "id", "status",
+            "student__id", "student__username",
+            "instructor__id", "instructor__username",
+            "course__id", "course__name",
+        )
+
+
 class Enrollment(models.Model):
     id = models.AutoField(primary_key=True)
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="enrollments")
@@ -65,6 +107,8 @@ class Enrollment(models.Model):
         REJECTED = "rejected", "Rejected"
     status = models.CharField(max_length=20, choices=Status, default="pending")
 
+    objects = EnrollmentQuerySet.as_manager()
+
     class Meta:
         unique_together = ["course", "student"]
 
@@ -76,26 +120,181 @@ class CourseVideo(models.Model):
     id = models.AutoField(primary_key=True)
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="videos")
     title = models.CharField(max_length=100)
-    video = models.FileField(upload_to="videos/")
+    video = models.FileField(upload_to="videos/", storage=video_storage)
     order = models.PositiveSmallIntegerField()
+    # read from the container headers at upload (api/probe.py); null when
+    # the file couldn't be probed
+    duration = models.FloatField(null=True, blank=True, help_text="seconds")
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    bitrate = models.PositiveIntegerField(null=True, blank=True, help_text="bits per second")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the stored file, so replacing or deleting it can release the old one
+        instance._old_video = instance.__dict__.get("video")
+        return instance
+
+    @classmethod
+    def reserve_orders(cls, course_id, count=1):
+        """
+        First of `count` consecutive free orders at the end of a course's
+        playlist. One statement locks the course row and reads its last
+        order, so concurrent uploads queue up instead of sharing a number;
+        call it inside a transaction, which holds the lock until commit.
+        """
+        last_order = (
+            Course.all_objects.select_for_update(of=("self",))
+            .filter(id=course_id)
+            .annotate(
+                last_order=models.Subquery(
+                    cls.objects.filter(course=models.OuterRef("pk")).order_by("-order").values("order")[:1]
+                )
+            )
+            .values_list("last_order", flat=True)
+            .first()
+        )
+        return (last_order or 0) + 1
+
+    def probe_file(self):
+        """Fill duration, resolution and bitrate from the (new) file's headers."""
+        try:
+            if self.video._committed:
+                with self.video.storage.open(self.video.name, "rb") as file:
+                    info = probe(file)
+            else:
+                info = probe(self.video.file)
+        except (ProbeError, OSError):
+            return
+        self.duration, self.width, self.height, self.bitrate = info
+
     def save(self, *args, **kwargs):
+        if self.video and not self.video._committed:
+            self.probe_file()
         if not self.order:
-            last_video = CourseVideo.objects.filter(course=self.course).order_by("-order").first()
-            if last_video:
-                self.order = last_video.order + 1
-            else:
-                self.order = 1
-        super().save(*args, **kwargs)
+            with transaction.atomic():
+                self.order = CourseVideo.reserve_orders(self.course_id)
+                super().save(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
      
 
     def __str__(self):
         return f"{self.course.name} - {self.title}"
     
     class Meta:
-        ordering = ["-created_at"]
+        # the playlist order; reads are served straight from the (course, order) index
+        ordering = ["order"]
+        indexes = [models.Index(fields=["course", "order"], name="coursevideo_course_order_idx")]
+
+class VideoWatchPosition(models.Model):
+    """Last reported playback position of a student in a video (see api/heartbeats.py)."""
+    id = models.AutoField(primary_key=True)
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name="watch_positions")
+    video = models.ForeignKey(CourseVideo, on_delete=models.CASCADE, related_name="watch_positions")
+    position = models.FloatField(help_text="seconds")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ["student", "video"]
+
+
+class MediaBlob(models.Model):
+    """A file of ContentAddressedStorage and the number of fields referencing it."""
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    references = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @classmethod
+    def acquire(cls, name, size):
+        blobs = cls.objects.filter(name=name)
+        if blobs.update(references=models.F("references") + 1):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(name=name, size=size, references=1)
+        except IntegrityError:
+            # stored concurrently by another upload of the same content
+            blobs.update(references=models.F("references") + 1)
+
+    @classmethod
+    def release(cls, name):
+        """
+        Drop a reference; True when it was the last one. The row stays, with
+        no references, until the storage removes the file (see reap).
+        """
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(name=name).first()
+            if blob is None or not blob.references:
+                return False
+            cls.objects.filter(id=blob.id).update(references=models.F("references") - 1)
+            return blob.references == 1
+
+    @classmethod
+    def reap(cls, name, delete_file):
+        """
+        Delete an unreferenced blob and its file. The row lock serializes
+        this with acquire(), so a blob taken back since release() is kept.
+        """
+        with transaction.atomic():
+            blob = cls.objects.select_for_update().filter(name=name).first()
+            if blob is None or blob.references:
+                return False
+            delete_file(name)
+            blob.delete()
+            return True
+
+
+class VideoUploadSession(models.Model):
+    """
+    A resumable upload of one video. Chunks of chunk_size bytes (the last
+    one shorter) are written into a preallocated temp file at their offset,
+    in any order; finalizing turns the file into a CourseVideo.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="video_uploads")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="video_uploads")
+    title = models.CharField(max_length=100)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def chunk_count(self):
+        return -(-self.size // self.chunk_size)
+
+    def chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.VIDEO_UPLOAD_TEMP_DIR, f"{self.id}.part")
+
+    def discard(self):
+        try:
+            os.remove(self.temp_path)
+        except FileNotFoundError:
+            pass
+        self.delete()
+
+    def __str__(self):
+        return f"{self.course.name} - {self.title} ({self.id})"
+
+
+class VideoUploadChunk(models.Model):
+    session = models.ForeignKey(VideoUploadSession, on_delete=models.CASCADE, related_name="chunks")
+    index = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ["session", "index"]
+
 
 class CourseComment(models.Model):
     id = models.AutoField(primary_key=True)
@@ -126,6 +325,55 @@ class CourseLike(models.Model):
         return f"{self.course.name} - {self.user.username}"
 
 
+class CourseLikeCounter(models.Model):
+    """
+    Pending like/unlike deltas for a course, spread over
+    settings.COURSE_LIKE_SHARDS rows so concurrent likes on one course
+    don't queue on a single row lock. consolidate() folds them into
+    Course.likes.
+
+    Course.likes stays the authoritative count: it holds every like up to
+    the last consolidate_course_likes run, and the shards only what came
+    since. That is why the migration adding this table seeds nothing: the
+    likes given before it are already in Course.likes, kept there by the
+    per-like signal this replaced.
+    """
+    id = models.AutoField(primary_key=True)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="like_shards")
+    shard = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ["course", "shard"]
+
+    @classmethod
+    def add(cls, course_id, delta):
+        shard = random.randrange(getattr(settings, "COURSE_LIKE_SHARDS", 16))
+        shards = cls.objects.filter(course_id=course_id, shard=shard)
+        if shards.update(count=models.F("count") + delta):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(course_id=course_id, shard=shard, count=delta)
+        except IntegrityError:
+            # another request created the shard first
+            shards.update(count=models.F("count") + delta)
+
+    @classmethod
+    def consolidate(cls):
+        """Move every pending delta into Course.likes; returns the course ids changed."""
+        totals = {}
+        with transaction.atomic():
+            shards = list(cls.objects.select_for_update().exclude(count=0).values_list("id", "course_id", "count"))
+            for _, course_id, count in shards:
+                totals[course_id] = totals.get(course_id, 0) + count
+            for course_id, total in totals.items():
+                if total:
+                    Course.all_objects.filter(id=course_id).update(likes=models.F("likes") + total)
+            cls.objects.filter(id__in=[shard_id for shard_id, _, _ in shards]).update(count=0)
+        return [course_id for course_id, total in totals.items() if total]
+
+
 class CourseRating(models.Model):
     class RatingChoices(models.IntegerChoices):
         ONE = 1
@@ -143,13 +391,73 @@ class CourseRating(models.Model):
     class Meta:
         unique_together = ["course", "user"]
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # remember the stored rating for queryset deletes, which don't go
+        # through delete() below
+        instance = super().from_db(db, field_names, values)
+        instance._old_rating = instance.rating
+        return instance
+
+    def locked_rating(self):
+        return CourseRating.objects.select_for_update().filter(id=self.id).values_list("rating", flat=True).first()
+
+    def save(self, *args, **kwargs):
+        """
+        Save the rating and, through the post_save signal, apply it to the
+        course aggregates (api/signals.py) in one transaction.
+
+        An edit reads the rating it replaces with a row lock. The old value
+        can't come from a subquery in the aggregate UPDATE instead: under
+        READ COMMITTED that subquery reads the statement's snapshot, so two
+        concurrent edits would still both subtract the same value. The lock
+        makes the second edit wait and read the first one's rating.
+        """
+        with transaction.atomic():
+            if not self._state.adding:
+                self._old_rating = self.locked_rating()
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        # same transaction and lock as save()
+        with transaction.atomic():
+            self._old_rating = self.locked_rating()
+            if self._old_rating is None:
+                # deleted concurrently: its rating is already out of the aggregates
+                return 0, {}
+            return super().delete(*args, **kwargs)
+
+class CourseProgressTrackingQuerySet(models.QuerySet):
+    def for_listing(self):
+        videos = CourseVideo.objects.only("id", "course_id", "title", "video", "order", "duration")
+        return self.select_related("student", "course").prefetch_related(
+            models.Prefetch("completed_videos", queryset=videos),
+            models.Prefetch("course__videos", queryset=videos),
+        )
+
+    def recount_completed(self):
+        """Set completed_count from the through table, with one UPDATE."""
+        through = CourseProgressTracking.completed_videos.through
+        completed = (
+            through.objects.filter(courseprogresstracking_id=models.OuterRef("id"))
+            .order_by()
+            .values("courseprogresstracking_id")
+            .annotate(count=models.Count("id"))
+            .values("count")
+        )
+        return self.update(completed_count=Coalesce(models.Subquery(completed), 0))
+
+
 class CourseProgressTracking(models.Model):
     id = models.AutoField(primary_key=True)
     student = models.ForeignKey(User, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     completed_videos = models.ManyToManyField(CourseVideo, blank=True)
+    completed_count = models.PositiveIntegerField(default=0) #maintained by signals
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CourseProgressTrackingQuerySet.as_manager()
     
     class Meta:
         unique_together = ["student", "course"]
@@ -171,30 +479,31 @@ class Quiz(models.Model):
 
 
 class Question(models.Model):
-    # class QuestionType(models.TextChoices):
-    #     TRUE_FALSE = "TF", "True/False"
-    #     MULTIPLE_CHOICE = "MCQ", "Multiple Choice"
-    #     SINGLE_OPTION = "OPTION", "Single Option"
-    #     Text = "Text", "Text"
+    class QuestionType(models.TextChoices):
+        TRUE_FALSE = "TF", "True/False"
+        MULTIPLE_CHOICE = "MCQ", "Multiple Choice"
+        SINGLE_OPTION = "OPTION", "Single Option"
+        Text = "Text", "Text"
 
     id = models.AutoField(primary_key=True)
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE,related_name="questions")
     question = models.TextField()
-    # question_type = models.CharField(max_length=20, choices=QuestionType, default=QuestionType.Text)
+    question_type = models.CharField(max_length=20, choices=QuestionType, default=QuestionType.Text)
     marks = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-# class Answer(models.Model):
-#     id = models.AutoField(primary_key=True)
-#     question = models.ForeignKey(Question, on_delete=models.CASCADE)
-#     answer = models.TextField()
-#     is_correct = models.BooleanField(default=False)
-#     created_at = models.DateTimeField(auto_now_add=True)
-#     updated_at = models.DateTimeField(auto_now=True)
+# an option of a TF/OPTION/MCQ question; the correct ones form its answer key
+class Answer(models.Model):
+    id = models.AutoField(primary_key=True)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="options")
+    answer = models.TextField()
+    is_correct = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
-#     class Meta:
-#         unique_together = ["question", "answer"]
+    class Meta:
+        unique_together = ["question", "answer"]
 
 class QuizAttempt(models.Model):
     class QualifiedStatus(models.TextChoices):
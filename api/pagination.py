@@ -0,0 +1,58 @@
+from rest_framework import serializers
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+
+class KeysetPagination(CursorPagination):
+    # pages seek past the last key seen instead of scanning an OFFSET,
+    # so a deep page costs the same as the first one
+    page_size_query_param = "limit"
+    max_page_size = 100
+
+    def __init__(self, ordering="id"):
+        self.ordering = ordering
+
+
+class PaginationMixin:
+    """
+    Paginates list responses of a plain APIView.
+
+    Limit/offset pagination (REST_FRAMEWORK settings) is used by default.
+    Clients opt in to keyset pagination with ?pagination=cursor (the
+    returned next/previous links carry ?cursor=) and may pick the key with
+    ?ordering= among keyset_ordering_fields, e.g. ?ordering=-created_at.
+    """
+    pagination_class = api_settings.DEFAULT_PAGINATION_CLASS
+    keyset_pagination_class = KeysetPagination
+    keyset_ordering_fields = ["id"]
+
+    def use_keyset(self):
+        params = self.request.query_params
+        return "cursor" in params or params.get("pagination") == "cursor"
+
+    def get_keyset_ordering(self):
+        ordering = self.request.query_params.get("ordering", "id")
+        if ordering.lstrip("-") not in self.keyset_ordering_fields:
+            raise serializers.ValidationError(
+                {"ordering": f"Ordering must be one of {', '.join(self.keyset_ordering_fields)}"}
+            )
+        return ordering
+
+    def get_paginator(self, keyset=True):
+        if keyset and self.use_keyset():
+            return self.keyset_pagination_class(self.get_keyset_ordering())
+        if self.pagination_class is None:
+            return None
+        return self.pagination_class()
+
+    # keyset=False keeps the queryset's own ordering (e.g. search rank)
+    def paginate(self, queryset, serializer_class, keyset=True, **kwargs):
+        paginator = self.get_paginator(keyset)
+        if not queryset.ordered:
+            queryset = queryset.order_by("id")
+        page = paginator.paginate_queryset(queryset, self.request, view=self) if paginator else None
+        if page is None:
+            return Response(serializer_class(queryset, many=True, **kwargs).data)
+        serializer = serializer_class(page, many=True, **kwargs)
+        return paginator.get_paginated_response(serializer.data)
@@ -1,6 +1,32 @@
+from django.db.models import Exists, OuterRef
 from rest_framework.permissions import BasePermission
+from .cache import get_course_membership
 from .models import *
 
+
+def get_membership(request, course):
+    """
+    (is_instructor, is_approved_student) of request.user on course, loaded
+    with one query, then memoized on the request and briefly in the cache.
+    """
+    memberships = getattr(request, "_course_memberships", None)
+    if memberships is None:
+        memberships = request._course_memberships = {}
+    if course.id not in memberships:
+        user = request.user
+        memberships[course.id] = tuple(
+            get_course_membership(
+                course.id,
+                user.id,
+                lambda: Course.all_objects.filter(id=course.id).values_list(
+                    Exists(Course.instructors.through.objects.filter(course_id=OuterRef("id"), user_id=user.id)),
+                    Exists(Enrollment.objects.filter(course_id=OuterRef("id"), student_id=user.id, status="approved")),
+                ).first() or (False, False),
+            )
+        )
+    return memberships[course.id]
+
+
 class IsAdminUserRole(BasePermission):
     def has_permission(self, request, view):
         return request.user.role == "admin"
@@ -30,19 +56,19 @@ class IsUserorAdmin(BasePermission):
 
 class IsAdminOrInstructorOrStudentRelatedToCourse(BasePermission):
     def has_object_permission(self, request, view, course):
-        return ((request.user.role == "admin") or (request.user in course.instructor.all()) or (Enrollment.objects.filter(course=course, student = request.user, status = "approved").exists()))
+        return ((request.user.role == "admin") or any(get_membership(request, course)))
                 
 class IsAdminOrInstructorRelatedToCourse(BasePermission):
     def has_object_permission(self, request, view, course):
-        return ((request.user.role == "admin") or (request.user in course.instructor.all()))
+        return ((request.user.role == "admin") or get_membership(request, course)[0])
                 
 class IsStudentRelatedToCourse(BasePermission):
     def has_object_permission(self, request, view, course):
-        return (Enrollment.objects.filter(course=course, student = request.user, status = "approved").exists())
+        return get_membership(request, course)[1]
 
 class IsInstructorRelatedToCourse(BasePermission):
     def has_object_permission(self, request, view, course):
-        return (request.user in course.instructor.all())
+        return get_membership(request, course)[0]
     
 # class IsInstructorCourseAndStudentAreRelated(BasePermission):
 #     def has_object_permission(self, request, view, enrollment):
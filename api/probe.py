@@ -0,0 +1,200 @@
+"""
+Duration, resolution and bitrate of MP4/MOV and WebM/Matroska files, read
+from their headers only: the parsers seek over media data (mdat boxes,
+Matroska clusters) instead of reading it, so probing a lecture costs a few
+small reads wherever its index sits in the file.
+"""
+import math
+import os
+import struct
+from collections import namedtuple
+
+VideoInfo = namedtuple("VideoInfo", ["duration", "width", "height", "bitrate"])
+
+# the largest value the PositiveIntegerFields storing them take on every backend
+MAX_FIELD_VALUE = 2**31 - 1
+
+
+class ProbeError(ValueError):
+    pass
+
+
+def read_exactly(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise ProbeError("Unexpected end of file")
+    return data
+
+
+def file_size(file):
+    position = file.tell()
+    size = file.seek(0, os.SEEK_END)
+    file.seek(position)
+    return size
+
+
+# MP4 / ISO base media: a tree of [size][type] boxes
+
+
+def mp4_boxes(file, end):
+    """(type, payload start, payload end) of the boxes up to end."""
+    while file.tell() + 8 <= end:
+        start = file.tell()
+        size, box_type = struct.unpack(">I4s", read_exactly(file, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", read_exactly(file, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            raise ProbeError("Invalid box size")
+        yield box_type, start + header, min(start + size, end)
+        file.seek(start + size)
+
+
+def probe_mp4(file, size):
+    duration = width = height = None
+    for box_type, start, end in mp4_boxes(file, size):
+        if box_type != b"moov":
+            continue
+        for child, child_start, child_end in mp4_boxes(file, end):
+            if child == b"mvhd":
+                version = read_exactly(file, 4)[0]
+                if version == 1:
+                    timescale, length = struct.unpack(">16xIQ", read_exactly(file, 28))
+                else:
+                    timescale, length = struct.unpack(">8xII", read_exactly(file, 16))
+                if timescale:
+                    duration = length / timescale
+            elif child == b"trak" and width is None:
+                for atom, atom_start, atom_end in mp4_boxes(file, child_end):
+                    if atom == b"tkhd":
+                        version = read_exactly(file, 4)[0]
+                        # width and height close the box, as 16.16 fixed point
+                        file.seek(atom_start + (88 if version == 1 else 76))
+                        track_width, track_height = struct.unpack(">II", read_exactly(file, 8))
+                        if track_width and track_height:
+                            width, height = track_width >> 16, track_height >> 16
+        break
+    if duration is None:
+        raise ProbeError("No movie header")
+    return duration, width, height
+
+
+# Matroska / WebM: EBML elements of [variable length id][variable length size]
+
+EBML = 0x1A45DFA3
+SEGMENT = 0x18538067
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+CLUSTER = 0x1F43B675
+UNKNOWN_SIZE = -1
+
+
+def read_vint(file, keep_marker):
+    first = read_exactly(file, 1)[0]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise ProbeError("Invalid EBML number")
+    value = first if keep_marker else first & (0xFF >> length)
+    all_ones = value == (0xFF >> length)
+    for byte in read_exactly(file, length - 1):
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    if not keep_marker and all_ones:
+        return UNKNOWN_SIZE
+    return value
+
+
+def ebml_elements(file, end):
+    while file.tell() < end:
+        element_id = read_vint(file, keep_marker=True)
+        size = read_vint(file, keep_marker=False)
+        start = file.tell()
+        element_end = end if size == UNKNOWN_SIZE else min(start + size, end)
+        yield element_id, start, element_end
+        file.seek(element_end)
+
+
+def read_uint(file, start, end):
+    file.seek(start)
+    return int.from_bytes(read_exactly(file, end - start), "big")
+
+
+def probe_matroska(file, size):
+    timecode_scale = 1_000_000
+    duration = width = height = None
+    for element_id, start, end in ebml_elements(file, size):
+        if element_id != SEGMENT:
+            continue
+        for child, child_start, child_end in ebml_elements(file, end):
+            if child == INFO:
+                for field, field_start, field_end in ebml_elements(file, child_end):
+                    if field == TIMECODE_SCALE:
+                        timecode_scale = read_uint(file, field_start, field_end)
+                    elif field == DURATION:
+                        file.seek(field_start)
+                        raw = read_exactly(file, field_end - field_start)
+                        duration = struct.unpack(">f" if len(raw) == 4 else ">d", raw)[0]
+            elif child == TRACKS:
+                for entry, entry_start, entry_end in ebml_elements(file, child_end):
+                    if entry != TRACK_ENTRY or width is not None:
+                        continue
+                    for field, field_start, field_end in ebml_elements(file, entry_end):
+                        if field == TRACK_VIDEO:
+                            for pixel, pixel_start, pixel_end in ebml_elements(file, field_end):
+                                if pixel == PIXEL_WIDTH:
+                                    width = read_uint(file, pixel_start, pixel_end)
+                                elif pixel == PIXEL_HEIGHT:
+                                    height = read_uint(file, pixel_start, pixel_end)
+            elif child == CLUSTER:
+                # media data: everything needed comes before it
+                break
+        break
+    if duration is None:
+        raise ProbeError("No segment duration")
+    return duration * timecode_scale / 1e9, width, height
+
+
+def probe(file):
+    """VideoInfo of an open binary file, or ProbeError if it can't be read."""
+    size = file_size(file)
+    file.seek(0)
+    head = file.read(12)
+    file.seek(0)
+    try:
+        if head[:4] == struct.pack(">I", EBML):
+            duration, width, height = probe_matroska(file, size)
+        elif head[4:8] in (b"ftyp", b"moov", b"free", b"wide", b"mdat", b"skip"):
+            duration, width, height = probe_mp4(file, size)
+        else:
+            raise ProbeError("Unknown container")
+    except struct.error as e:
+        raise ProbeError(str(e))
+    finally:
+        file.seek(0)
+    # headers are untrusted input: a NaN, negative or absurd value is a
+    # file that can't be probed, not one to store
+    if not (math.isfinite(duration) and duration > 0):
+        raise ProbeError("Invalid duration")
+    for dimension in (width, height):
+        if dimension is not None and not 0 < dimension <= MAX_FIELD_VALUE:
+            raise ProbeError("Invalid frame size")
+    bitrate = round(size * 8 / duration)
+    if bitrate > MAX_FIELD_VALUE:
+        raise ProbeError("Invalid bitrate")
+    return VideoInfo(duration, width, height, bitrate)
+
+
+def probe_path(path):
+    with open(path, "rb") as file:
+        return probe(file)
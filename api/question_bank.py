@@ -0,0 +1,120 @@
+import codecs
+import csv
+import itertools
+import json
+
+from django.db import transaction
+
+from .cache import invalidate_quiz
+from .grading import recompute_quiz_totals
+from .models import Answer, Question
+from .serializer import QuestionSerializer
+
+IMPORT_FIELDS = ["question", "question_type", "marks", "options"]
+# rows are validated one at a time and inserted in batches of this size
+BATCH_SIZE = 500
+# an import stops collecting errors after this many
+MAX_ERRORS = 50
+
+
+def iter_csv_rows(file):
+    """
+    Questions from a CSV file with the header
+    question,question_type,marks,options,correct where options and correct
+    hold option texts separated by "|", e.g. What is 2+2?,OPTION,1,3|4|5,4
+    """
+    for row in csv.DictReader(codecs.iterdecode(file, "utf-8-sig")):
+        options = [option for option in (row.get("options") or "").split("|") if option]
+        correct = set((row.get("correct") or "").split("|"))
+        question = {
+            "question": row.get("question"),
+            "question_type": row.get("question_type") or Question.QuestionType.Text,
+            "options": [{"answer": option, "is_correct": option in correct} for option in options],
+        }
+        if row.get("marks"):
+            question["marks"] = row["marks"]
+        yield question
+
+
+def load_json_rows(file):
+    """
+    Questions from a JSON file holding an array of question objects.
+    Raises ValueError if it isn't one.
+    """
+    rows = json.load(codecs.getreader("utf-8-sig")(file))
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array of questions")
+    return rows
+
+
+def iter_jsonl_rows(file):
+    """Questions from a JSON Lines file, one question object per line."""
+    for line in file:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def import_questions(quiz, rows):
+    """
+    Validate and insert question rows into a quiz. Rows are read lazily and
+    inserted with bulk_create in batches; quiz totals are recomputed and the
+    cached quiz payload invalidated once at the end. Nothing is saved if any
+    row is invalid.
+    Returns (number of questions imported, list of row errors).
+    """
+    imported = 0
+    errors = []
+    batch = []
+
+    def flush():
+        questions = Question.objects.bulk_create([Question(quiz=quiz, **row) for row, _ in batch])
+        Answer.objects.bulk_create(
+            [
+                Answer(question=question, **option)
+                for question, (_, options) in zip(questions, batch)
+                for option in options
+            ]
+        )
+        batch.clear()
+
+    rows = iter(rows)
+    with transaction.atomic():
+        for number in itertools.count(1):
+            try:
+                row = next(rows)
+            except StopIteration:
+                break
+            except UnicodeDecodeError:
+                # a file reader can't go on after this: report the row and stop
+                errors.append({"row": number, "errors": "The file must be UTF-8 encoded."})
+                break
+            except csv.Error as e:
+                errors.append({"row": number, "errors": f"Malformed CSV: {e}"})
+                break
+            if not isinstance(row, dict):
+                errors.append({"row": number, "errors": "Expected a question object."})
+            else:
+                serializer = QuestionSerializer(data=row, fields=IMPORT_FIELDS)
+                if serializer.is_valid():
+                    # once a row failed only the validation goes on
+                    if not errors:
+                        data = dict(serializer.validated_data)
+                        batch.append((data, data.pop("options", [])))
+                        imported += 1
+                else:
+                    errors.append({"row": number, "errors": serializer.errors})
+            if len(errors) >= MAX_ERRORS:
+                break
+            if len(batch) >= BATCH_SIZE:
+                flush()
+        if errors:
+            transaction.set_rollback(True)
+            return 0, errors
+        if batch:
+            flush()
+        recompute_quiz_totals(quiz.id)
+        transaction.on_commit(lambda: invalidate_quiz(quiz.id))
+    return imported, errors
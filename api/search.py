@@ -0,0 +1,251 @@
+import bisect
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, F, IntegerField, When
+from django.utils.module_loading import import_string
+
+from .models import Course
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class BaseSearchBackend:
+    def search(self, query, limit):
+        """Return a Course queryset of at most `limit` matches, best first."""
+        raise NotImplementedError
+
+    def index(self, course):
+        raise NotImplementedError
+
+    def remove(self, course_id):
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Full text search over the stored, GIN indexed Course.search_vector."""
+
+    def search(self, query, limit):
+        search_query = SearchQuery(query)
+        return (
+            Course.objects.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .order_by("-rank", "id")[:limit]
+        )
+
+    def index(self, course):
+        Course.all_objects.filter(id=course.id).update(
+            search_vector=SearchVector("name", weight="A") + SearchVector("description", weight="B")
+        )
+
+    def remove(self, course_id):
+        pass
+
+
+class InvertedIndexSearchBackend(BaseSearchBackend):
+    """
+    In-process inverted index with BM25 ranking, for databases without
+    full text search (SQLite). Built from the database on first search and
+    updated incrementally through index()/remove(); each process keeps its
+    own copy, so it suits single-process deployments.
+    """
+    k1 = 1.2
+    b = 0.75
+    # a term in the name counts as much as this many in the description
+    name_weight = 2
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built = False
+        self.postings = defaultdict(dict)  # term -> {course_id: term frequency}
+        self.doc_terms = {}  # course_id -> Counter of its terms
+        self.doc_lengths = {}
+        self.total_length = 0
+
+    def build(self):
+        with self.lock:
+            if self.built:
+                return
+            for course_id, name, description in Course.objects.values_list("id", "name", "description").iterator():
+                self._add(course_id, name, description)
+            self.built = True
+
+    def _terms(self, name, description):
+        terms = Counter(tokenize(description))
+        for term in tokenize(name):
+            terms[term] += self.name_weight
+        return terms
+
+    def _add(self, course_id, name, description):
+        self._remove(course_id)
+        terms = self._terms(name, description)
+        for term, frequency in terms.items():
+            self.postings[term][course_id] = frequency
+        self.doc_terms[course_id] = terms
+        self.doc_lengths[course_id] = sum(terms.values())
+        self.total_length += self.doc_lengths[course_id]
+
+    def _remove(self, course_id):
+        terms = self.doc_terms.pop(course_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            documents = self.postings[term]
+            documents.pop(course_id, None)
+            if not documents:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(course_id)
+
+    def index(self, course):
+        # until the first search the index is built straight from the database
+        if not self.built:
+            return
+        with self.lock:
+            if course.is_deleted:
+                self._remove(course.id)
+            else:
+                self._add(course.id, course.name, course.description)
+
+    def remove(self, course_id):
+        if not self.built:
+            return
+        with self.lock:
+            self._remove(course_id)
+
+    def rank(self, query, limit):
+        self.build()
+        with self.lock:
+            documents = len(self.doc_terms)
+            if not documents:
+                return []
+            average_length = self.total_length / documents
+            scores = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                for course_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[course_id] / average_length)
+                    scores[course_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def search(self, query, limit):
+        course_ids = [course_id for course_id, _ in self.rank(query, limit)]
+        if not course_ids:
+            return Course.objects.none()
+        position = Case(
+            *[When(id=course_id, then=i) for i, course_id in enumerate(course_ids)],
+            output_field=IntegerField(),
+        )
+        return Course.objects.filter(id__in=course_ids).order_by(position)
+
+
+class CourseNameIndex:
+    """
+    Sorted array of the word suffixes of every course name ("intro to
+    python" is stored as "intro to python", "to python" and "python"), so
+    a prefix lookup is one bisect plus a scan of at most the matches
+    returned. Built on first use and updated incrementally like the
+    inverted index.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built = False
+        self.keys = []  # sorted (suffix, course_id)
+        self.names = {}  # course_id -> name
+
+    @staticmethod
+    def suffixes(name):
+        words = tokenize(name)
+        return {" ".join(words[i:]) for i in range(len(words))}
+
+    def build(self):
+        with self.lock:
+            if self.built:
+                return
+            for course_id, name in Course.objects.values_list("id", "name").iterator():
+                self.names[course_id] = name
+                self.keys.extend((suffix, course_id) for suffix in self.suffixes(name))
+            self.keys.sort()
+            self.built = True
+
+    def _remove(self, course_id):
+        name = self.names.pop(course_id, None)
+        if name is None:
+            return
+        for suffix in self.suffixes(name):
+            i = bisect.bisect_left(self.keys, (suffix, course_id))
+            if i < len(self.keys) and self.keys[i] == (suffix, course_id):
+                del self.keys[i]
+
+    def index(self, course):
+        if not self.built:
+            return
+        with self.lock:
+            self._remove(course.id)
+            if not course.is_deleted:
+                self.names[course.id] = course.name
+                for suffix in self.suffixes(course.name):
+                    bisect.insort(self.keys, (suffix, course.id))
+
+    def remove(self, course_id):
+        if not self.built:
+            return
+        with self.lock:
+            self._remove(course_id)
+
+    def complete(self, prefix, limit):
+        """Up to `limit` (id, name) pairs whose name has a word starting with prefix."""
+        prefix = " ".join(tokenize(prefix))
+        if not prefix:
+            return []
+        self.build()
+        results = {}
+        with self.lock:
+            i = bisect.bisect_left(self.keys, (prefix,))
+            while i < len(self.keys) and len(results) < limit:
+                suffix, course_id = self.keys[i]
+                if not suffix.startswith(prefix):
+                    break
+                results.setdefault(course_id, self.names[course_id])
+                i += 1
+        return list(results.items())
+
+
+_backend = None
+_name_index = None
+
+
+def get_search_backend():
+    """
+    The backend named by settings.COURSE_SEARCH_BACKEND, or else the one
+    matching the database vendor.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "COURSE_SEARCH_BACKEND", None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == "postgresql":
+            _backend = PostgresSearchBackend()
+        else:
+            _backend = InvertedIndexSearchBackend()
+    return _backend
+
+
+def get_name_index():
+    global _name_index
+    if _name_index is None:
+        _name_index = CourseNameIndex()
+    return _name_index
@@ -1,7 +1,14 @@
+import json
+import math
+import os
+
+from django.conf import settings
 from rest_framework import serializers
 from django.db.models import Sum
 from .models import *
 from django.db import transaction
+from django.utils import timezone
+from .grading import MAX_OPTIONS, auto_grade_quiz_attempts, normalize_answer, recompute_quiz_attempt_scores
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 
@@ -90,11 +97,12 @@ class UpadateUserPasswordSerializer(serializers.Serializer):
 
 class CourseSerializer(serializers.ModelSerializer):
     comments = serializers.SerializerMethodField(read_only=True)
+    rating_histogram = serializers.SerializerMethodField(read_only=True)
     instructors = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), many = True, required = False)
 
     class Meta:
         model = Course
-        fields = ["id", "name", "description", "instructors", "likes", "comments", "rating"]
+        fields = ["id", "name", "description", "instructors", "likes", "comments", "rating", "rating_histogram"]
         extra_kwargs = {
             "likes": {"read_only": True},
             "rating": {"read_only": True}
@@ -118,13 +126,20 @@ class CourseSerializer(serializers.ModelSerializer):
         return attrs
 
     def get_comments(self, obj):
-        comments = CourseComment.objects.filter(course=obj)
+        # reads the prefetched cache when the queryset came from for_listing()
+        comments = obj.coursecomment_set.all()
         return CourseCommentSerializer(comments, many=True).data
 
+    def get_rating_histogram(self, obj):
+        return {str(stars): getattr(obj, f"rating_{stars}_count") for stars in range(1, 6)}
+
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         if "instructors" in representation:
-            representation["instructors"] = UserSerializer(instance.instructors, fields=["id", "username"], many=True).data
+            representation["instructors"] = [
+                {"id": instructor.id, "username": instructor.username}
+                for instructor in instance.instructors.all()
+            ]
         return representation
 
 
@@ -141,11 +156,16 @@ class EnrollmentSerializer(serializers.ModelSerializer):
         return super().validate(attrs)
 
     def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation["student"] = UserSerializer(instance.student, fields=["id", "username"]).data
-        representation["instructor"] = UserSerializer(instance.instructor, fields=["id", "username"]).data if instance.instructor else None
-        representation["course"] = CourseSerializer(instance.course, fields=["id", "name"]).data
-        return representation
+        # built by hand instead of through nested serializers; paired with
+        # Enrollment.objects.for_listing() a listing renders from one query
+        instructor = instance.instructor
+        return {
+            "id": instance.id,
+            "student": {"id": instance.student.id, "username": instance.student.username},
+            "instructor": {"id": instructor.id, "username": instructor.username} if instructor else None,
+            "course": {"id": instance.course.id, "name": instance.course.name},
+            "status": instance.status,
+        }
     
     class Meta:
         model = Enrollment
@@ -159,7 +179,8 @@ class CourseVideoSerializer(serializers.ModelSerializer):
     class Meta:
         model = CourseVideo
         
-        fields = ["id", "course", "title", "video", "order", "created_at", "updated_at"]
+        fields = ["id", "course", "title", "video", "order", "duration", "width", "height", "bitrate", "created_at", "updated_at"]
+        read_only_fields = ["duration", "width", "height", "bitrate"]
         extra_kwargs = {
             "created_at": {"read_only": True},
             "updated_at": {"read_only": True},
@@ -175,6 +196,53 @@ class CourseVideoSerializer(serializers.ModelSerializer):
             for field_name in existing - allowed:
                 self.fields.pop(field_name)
 
+class VideoUploadSessionSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.IntegerField(required=False, min_value=1)
+    chunk_count = serializers.IntegerField(read_only=True)
+    received_chunks = serializers.SerializerMethodField()
+
+    class Meta:
+        model = VideoUploadSession
+        fields = ["id", "title", "filename", "size", "chunk_size", "chunk_count", "received_chunks", "created_at"]
+        read_only_fields = ["id", "created_at"]
+
+    def get_received_chunks(self, obj):
+        return sorted(obj.chunks.values_list("index", flat=True))
+
+    def validate_chunk_size(self, chunk_size):
+        if chunk_size < settings.VIDEO_UPLOAD_MIN_CHUNK_SIZE:
+            raise serializers.ValidationError(
+                f"Chunks must be at least {settings.VIDEO_UPLOAD_MIN_CHUNK_SIZE} bytes."
+            )
+        if chunk_size > settings.VIDEO_UPLOAD_MAX_CHUNK_SIZE:
+            raise serializers.ValidationError(
+                f"Chunks can be at most {settings.VIDEO_UPLOAD_MAX_CHUNK_SIZE} bytes."
+            )
+        return chunk_size
+
+    def validate_size(self, size):
+        if not size:
+            raise serializers.ValidationError("The file is empty.")
+        if size > settings.VIDEO_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Videos can be at most {settings.VIDEO_UPLOAD_MAX_SIZE} bytes."
+            )
+        return size
+
+    def validate_filename(self, filename):
+        return os.path.basename(filename)
+
+
+class WatchHeartbeatSerializer(serializers.Serializer):
+    position = serializers.FloatField(min_value=0)
+
+    def validate_position(self, position):
+        # FloatField takes "NaN", "inf" and overflowing numbers like 1e400
+        if not math.isfinite(position):
+            raise serializers.ValidationError("A valid number is required.")
+        return position
+
+
 class CourseCommentSerializer(serializers.ModelSerializer):
     course = serializers.PrimaryKeyRelatedField(queryset=Course.objects.all(), write_only=True)
     user = UserSerializer(read_only=True)
@@ -220,27 +288,45 @@ class CourseProgressTrackingSerializer(serializers.ModelSerializer):
         model = CourseProgressTracking
         fields = "__all__"
         extra_kwargs = {
+            "completed_count": {"read_only": True},
             "created_at": {"read_only": True},
             "updated_at": {"read_only": True},
         }
     
+    # both counts are denormalized and kept current by signals; with
+    # context["completion"] == "duration" videos count by their length
     def get_completion_percentage(self, obj):
-        total_videos = obj.course.videos.count()
-        completed_videos = obj.completed_videos.count()
+        if self.context.get("completion") == "duration":
+            percentage = self.get_duration_percentage(obj)
+            if percentage is not None:
+                return percentage
+        total_videos = obj.course.video_count
         if total_videos == 0:
             return 0 
-        return (completed_videos / total_videos) * 100
-
+        return (obj.completed_count / total_videos) * 100
+
+    # videos not probed yet weigh as much as the average probed one; None
+    # (count based) when no video of the course has a duration
+    def get_duration_percentage(self, obj):
+        durations = {video.id: video.duration for video in obj.course.videos.all()}
+        known = [duration for duration in durations.values() if duration]
+        if not known:
+            return None
+        average = sum(known) / len(known)
+        weights = {video_id: duration or average for video_id, duration in durations.items()}
+        watched = sum(weights.get(video.id, 0) for video in obj.completed_videos.all())
+        return watched / sum(weights.values()) * 100
+
+    # reads the caches prefetched by CourseProgressTracking.objects.for_listing()
     def get_remaining_videos(self, obj):
-        total_videos = obj.course.videos.all()
-        completed_videos = obj.completed_videos.all()
-        remaining_videos = total_videos.exclude(id__in=completed_videos.values_list('id', flat=True))
-        return CourseVideoSerializer(remaining_videos, fields=["id", "title","video" "order"], many=True).data
+        completed_ids = {video.id for video in obj.completed_videos.all()}
+        remaining_videos = [video for video in obj.course.videos.all() if video.id not in completed_ids]
+        return CourseVideoSerializer(remaining_videos, fields=["id", "title", "video", "order"], many=True).data
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
-        representation["course"] = CourseSerializer(instance.course, fields=["id", "name"]).data
-        representation["student"] = UserSerializer(instance.student, fields=["id", "username"]).data
+        representation["course"] = {"id": instance.course.id, "name": instance.course.name}
+        representation["student"] = {"id": instance.student.id, "username": instance.student.username}
         representation["completed_videos"] = CourseVideoSerializer(instance.completed_videos.all(),fields=["id", "title", "video", "order",], many=True).data
         return representation
 
@@ -261,8 +347,15 @@ class CourseProgressTrackingSerializer(serializers.ModelSerializer):
 #         model = Answer
 #         fields = "__all__"
 
+class AnswerSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Answer
+        fields = ["id", "answer", "is_correct"]
+
+
 class QuestionSerializer(serializers.ModelSerializer):
     quiz = serializers.PrimaryKeyRelatedField(queryset=Quiz.objects.all())
+    options = AnswerSerializer(many=True, required=False)
 
     def __init__(self, *args, **kwargs):
         fields = kwargs.pop("fields", None)
@@ -277,6 +370,59 @@ class QuestionSerializer(serializers.ModelSerializer):
         model = Question
         fields = "__all__"
 
+    def validate(self, data):
+        question_type = data.get("question_type", getattr(self.instance, "question_type", Question.QuestionType.Text))
+        options = data.get("options")
+        if options is None:
+            if self.instance is None and question_type != Question.QuestionType.Text:
+                raise serializers.ValidationError({"options": "Options are required for this question type."})
+            return data
+        if question_type == Question.QuestionType.Text:
+            if options:
+                raise serializers.ValidationError({"options": "Text questions have no options."})
+            return data
+        normalized = [normalize_answer(option["answer"], question_type) for option in options]
+        if len(set(normalized)) != len(normalized):
+            raise serializers.ValidationError({"options": "Options must be distinct."})
+        if len(options) > MAX_OPTIONS:
+            raise serializers.ValidationError({"options": f"A question can have at most {MAX_OPTIONS} options."})
+        if question_type == Question.QuestionType.TRUE_FALSE and set(normalized) - {"true", "false"}:
+            raise serializers.ValidationError({"options": "True/False options must be true or false."})
+        correct = sum(1 for option in options if option.get("is_correct"))
+        if not correct:
+            raise serializers.ValidationError({"options": "At least one option must be correct."})
+        if question_type != Question.QuestionType.MULTIPLE_CHOICE and correct > 1:
+            raise serializers.ValidationError({"options": "Only one option can be correct."})
+        return data
+
+    def set_options(self, question, options):
+        question.options.all().delete()
+        Answer.objects.bulk_create([Answer(question=question, **option) for option in options])
+
+    @transaction.atomic
+    def create(self, validated_data):
+        options = validated_data.pop("options", [])
+        question = super().create(validated_data)
+        self.set_options(question, options)
+        return question
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        options = validated_data.pop("options", None)
+        question = super().update(instance, validated_data)
+        if options is not None:
+            self.set_options(question, options)
+        return question
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        # students see the options but not which of them are correct
+        if self.context.get("hide_answer_key") and "options" in representation:
+            representation["options"] = [
+                {"id": option["id"], "answer": option["answer"]} for option in representation["options"]
+            ]
+        return representation
+
 class QuizSerializer(serializers.ModelSerializer):
     video = serializers.PrimaryKeyRelatedField(queryset=CourseVideo.objects.all())
     questions = serializers.SerializerMethodField()
@@ -295,8 +441,13 @@ class QuizSerializer(serializers.ModelSerializer):
         fields = "__all__"
     
     def get_questions(self, obj):
-        questions = Question.objects.filter(quiz=obj)
-        return QuestionSerializer(questions, fields=["id", "question", "marks"], many=True).data
+        questions = Question.objects.filter(quiz=obj).prefetch_related("options")
+        return QuestionSerializer(
+            questions,
+            fields=["id", "question", "question_type", "marks", "options"],
+            many=True,
+            context={"hide_answer_key": True},
+        ).data
     
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -330,6 +481,22 @@ class AnswerAttemptSerializer(serializers.ModelSerializer):
         representation["question"] = QuestionSerializer(instance.question, fields=["id", "question", "marks"]).data
         return representation
     
+class AnswerGradeSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    is_correct = serializers.BooleanField()
+
+
+class QuestionGradesSerializer(serializers.Serializer):
+    # {"<answer attempt id>": <is_correct>, ...}
+    grades = serializers.DictField(child=serializers.BooleanField(), allow_empty=False)
+
+    def validate_grades(self, grades):
+        try:
+            return {int(answer_id): is_correct for answer_id, is_correct in grades.items()}
+        except ValueError:
+            raise serializers.ValidationError("Answer ids must be integers.")
+
+
 class QuizAttemptSerializer(serializers.ModelSerializer):
     student = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
     quiz = serializers.PrimaryKeyRelatedField(queryset=Quiz.objects.all())
@@ -355,53 +522,33 @@ class QuizAttemptSerializer(serializers.ModelSerializer):
         answers = self.initial_data.get("answers", [])
 
         if self.instance:
-            existing_answers = AnswerAttempt.objects.filter(quiz_attempt=self.instance)
-            given_answers_ids = [answer["id"] for answer in answers]
-            if existing_answers.count() != len(given_answers_ids):
-                raise serializers.ValidationError({"error": "Invalid answer id"})
-            given_quiz_answers = AnswerAttempt.objects.filter(id__in=given_answers_ids, quiz_attempt=self.instance)
-            if given_quiz_answers.count() != len(given_answers_ids):
-                raise serializers.ValidationError({"error": "Invalid answer id"})
+            grades = AnswerGradeSerializer(data=answers, many=True)
+            if not grades.is_valid():
+                raise serializers.ValidationError({"answers": grades.errors})
+            given_answers_ids = [answer["id"] for answer in grades.validated_data]
             if not given_answers_ids:
                 raise serializers.ValidationError({"error": "No answers found for this quiz attempt."})
-        else:
-            quiz_id = self.initial_data.get("quiz")
-            quiz = Quiz.objects.get(id=quiz_id)
-            if quiz.questions.all().count() != len(answers):
-                raise serializers.ValidationError({"error": "Invalid question id 1"})
-            
-            given_quiz_questions_ids = [answer['question'] for answer in answers]
-            given_quiz_questions = Question.objects.filter(id__in=given_quiz_questions_ids, quiz=quiz)
-            if given_quiz_questions.count() != len(answers):
-                raise serializers.ValidationError({"error": "Invalid question id 2"})
-            if quiz.questions.all().count() == 0:
-                raise serializers.ValidationError({"error": "No questions found for this quiz."})
+            # the prefetched answers when the attempt came from QuizAttemptAPIView
+            existing_answers_ids = {answer.id for answer in self.instance.answers.all()}
+            if len(set(given_answers_ids)) != len(given_answers_ids) or set(given_answers_ids) != existing_answers_ids:
+                raise serializers.ValidationError({"error": "Invalid answer id"})
+            data["answers"] = grades.validated_data
             
         return data
-    
-    @transaction.atomic
-    def create(self, validated_data):
-        answers = self.initial_data.pop("answers")
-        quiz_attempt = QuizAttempt.objects.create(**validated_data)
-        validated_answers = []
-        for answer in answers:
-            answer["quiz_attempt"] = quiz_attempt.id
-            answer_serializer = AnswerAttemptSerializer(fields = ["quiz_attempt","question","answer"], data=answer)
-            if answer_serializer.is_valid(raise_exception=True):
-                validated_answers.append(AnswerAttempt(**answer_serializer.validated_data))
-        AnswerAttempt.objects.bulk_create(validated_answers)
-        return quiz_attempt
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        answers = self.initial_data.pop("answers")
+        grades = {answer["id"]: answer["is_correct"] for answer in validated_data["answers"]}
+        answers = list(instance.answers.all())
+        now = timezone.now()
         for answer in answers:
-            answer_instance = AnswerAttempt.objects.get(id=answer["id"])
-            answer_serializer = AnswerAttemptSerializer(answer_instance, fields = ["id","is_correct"], data=answer)
-            if answer_serializer.is_valid():
-                answer_serializer.save()
-            else:
-                raise serializers.ValidationError(answer_serializer.errors)
+            answer.is_correct = grades[answer.id]
+            answer.updated_at = now
+        AnswerAttempt.objects.bulk_update(answers, ["is_correct", "updated_at"])
+        graded = recompute_quiz_attempt_scores([instance.id])[instance.id]
+        instance.marks_obtained = graded.marks_obtained
+        instance.qualified_status = graded.qualified_status
+        instance.updated_at = graded.updated_at
         return instance
 
     def to_representation(self, instance):
@@ -411,3 +558,55 @@ class QuizAttemptSerializer(serializers.ModelSerializer):
         representation["answers"] = AnswerAttemptSerializer(instance.answers.all(), fields= ["id","question","answer","is_correct"], many=True).data
         return representation
 
+
+
+
+class SubmittedAnswerField(serializers.Field):
+    # free text, or the list of picked option texts of a multiple choice question
+    def to_internal_value(self, data):
+        if isinstance(data, list) and all(isinstance(item, str) for item in data):
+            return json.dumps(data)
+        if isinstance(data, str):
+            return data
+        raise serializers.ValidationError("Answer must be a string or a list of strings.")
+
+    def to_representation(self, value):
+        return value
+
+
+class AnswerSubmissionSerializer(serializers.Serializer):
+    question = serializers.IntegerField()
+    answer = SubmittedAnswerField()
+
+
+class QuizAttemptSubmissionSerializer(serializers.Serializer):
+    """
+    A student's submission of a whole quiz. Expects the quiz in
+    context["quiz"]; every question is checked against one query of the
+    quiz's question ids, the answers are inserted with one bulk_create and
+    objective questions are graded against their answer keys.
+    """
+    answers = AnswerSubmissionSerializer(many=True)
+
+    def validate_answers(self, answers):
+        question_ids = set(Question.objects.filter(quiz=self.context["quiz"]).values_list("id", flat=True))
+        if not question_ids:
+            raise serializers.ValidationError("No questions found for this quiz.")
+        given_ids = [answer["question"] for answer in answers]
+        if len(given_ids) != len(set(given_ids)):
+            raise serializers.ValidationError("Each question can only be answered once.")
+        if set(given_ids) != question_ids:
+            raise serializers.ValidationError("Answers must cover exactly the questions of this quiz.")
+        return answers
+
+    @transaction.atomic
+    def create(self, validated_data):
+        quiz_attempt = QuizAttempt.objects.create(quiz=self.context["quiz"], student=validated_data["student"])
+        AnswerAttempt.objects.bulk_create(
+            [
+                AnswerAttempt(quiz_attempt=quiz_attempt, question_id=answer["question"], answer=answer["answer"])
+                for answer in validated_data["answers"]
+            ]
+        )
+        auto_grade_quiz_attempts([quiz_attempt.id])
+        return quiz_attempt
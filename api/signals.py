@@ -1,99 +1,220 @@
-from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 from .models import *
+from .cache import invalidate_course, invalidate_course_membership, invalidate_quiz, invalidate_video_meta
+from .grading import recompute_quiz_attempt_scores, recompute_quiz_totals
+from .search import get_name_index, get_search_backend
 from django.db import transaction
-from django.db.models import Sum
+from django.db.models import F, Sum
+from django.db.models.functions import Cast, Coalesce, NullIf
 
 @receiver(pre_save, sender=User)
 def ensure_single_admin(sender, instance, **kwargs):
-    if instance.role == User.Role.ADMIN:
-        existing_admins = User.objects.filter(role=User.Role.ADMIN).exclude(id=instance.id)
+    if instance.role == Role.ADMIN:
+        existing_admins = User.objects.filter(role=Role.ADMIN).exclude(id=instance.id)
         if existing_admins.exists():
             raise ValidationError("There can only be one admin user.")
 
+#likes are counted on a random CourseLikeCounter shard and folded into
+#Course.likes by the consolidate_course_likes command
 @receiver(post_save, sender=CourseLike)
 def AddLike(sender, instance, created, **kwargs):
     if created:
-        course = Course.objects.select_for_update().get(id=instance.course.id)
-        course.likes += 1
-        course.save()
+        CourseLikeCounter.add(instance.course_id, 1)
 
 @receiver(post_delete, sender=CourseLike)
 def RemoveLike(sender, instance, **kwargs):
-    course = Course.objects.select_for_update().get(id=instance.course.id)
-    course.likes -= 1
-    course.save()
-
-@receiver(pre_save, sender=CourseRating)
-def capture_old_rating(sender, instance, **kwargs):
-    """Capture the old rating before updating."""
-    if instance.id:
-        old_rating = CourseRating.objects.get(id=instance.id).rating
-        instance._old_rating = old_rating
-    else:
-        instance._old_rating = None
+    CourseLikeCounter.add(instance.course_id, -1)
+
+def update_course_rating(course_id, added=None, removed=None):
+    """Apply one added and/or removed star value to the course aggregates in a single UPDATE."""
+    total = (added is not None) - (removed is not None)
+    delta = (added or 0) - (removed or 0)
+    fields = {
+        "total_ratings": F("total_ratings") + total,
+        "rating_sum": F("rating_sum") + delta,
+        # SET expressions read the values from before the update
+        "rating": Coalesce(
+            Cast(F("rating_sum") + delta, models.FloatField()) / NullIf(F("total_ratings") + total, 0),
+            0.0,
+        ),
+    }
+    if added is not None:
+        fields[f"rating_{added}_count"] = F(f"rating_{added}_count") + 1
+    if removed is not None:
+        histogram_field = f"rating_{removed}_count"
+        fields[histogram_field] = fields.get(histogram_field, F(histogram_field)) - 1
+    Course.all_objects.filter(id=course_id).update(**fields)
+    invalidate_course_on_commit(course_id)
 
 @receiver(post_save, sender=CourseRating)
 def create_and_update_course_rating(sender, instance, created, **kwargs):
-    """Signal receiver to update the course's average rating after a rating is added or updated."""
-    with transaction.atomic():
-        course = Course.objects.select_for_update().get(id=instance.course.id)
-        new_rating = instance.rating
-        sum_ratings = course.total_ratings * course.rating
-
-        if created:
-            course.total_ratings += 1
-            new_avg_rating = (sum_ratings + instance.rating) / (course.total_ratings)
-        else:
-            old_rating = instance._old_rating
-            new_avg_rating = (sum_ratings + instance.rating - old_rating) / course.total_ratings
-         
-            
-        course.rating = new_avg_rating
-        course.save()
+    """Signal receiver to update the course's rating aggregates after a rating is added or updated."""
+    old_rating = None if created else getattr(instance, "_old_rating", None)
+    if old_rating != instance.rating:
+        update_course_rating(instance.course_id, added=instance.rating, removed=old_rating)
+    instance._old_rating = instance.rating
 
 @receiver(post_delete, sender=CourseRating)
 def delete_course_rating(sender, instance, **kwargs):
-    """Signal receiver to update the course's average rating after a rating is deleted."""
-    with transaction.atomic():
-        course = Course.objects.select_for_update().get(id=instance.course.id)
-        sum_ratings = course.total_ratings * course.rating
-        course.total_ratings -= 1
-        if course.total_ratings <= 0:
-            course.rating = 0
-            course.total_ratings = 0
-        else:
-            course.rating = (sum_ratings - instance.rating) / course.total_ratings
-        course.save()
+    """Signal receiver to update the course's rating aggregates after a rating is deleted."""
+    update_course_rating(instance.course_id, removed=getattr(instance, "_old_rating", instance.rating))
 
 
-#updating the total marks everytime a new question is added
+#updating the total marks everytime a question is added, changed or removed
+#(bulk imports skip these and recompute once)
 @receiver(post_save, sender=Question)
-def update_quiz_total_marks(sender, instance, created, **kwargs):
-    with transaction.atomic():
-        total_marks = Question.objects.filter(quiz=instance.quiz).aggregate(total_marks=models.Sum('marks'))['total_marks']
-        instance.quiz.total_marks = total_marks
-        instance.quiz.passing_marks = total_marks * 70/100
-        instance.quiz.save()
+def update_quiz_total_marks_on_save(sender, instance, created, **kwargs):
+    recompute_quiz_totals(instance.quiz_id)
     
 @receiver(post_delete, sender=Question)
-def update_quiz_total_marks(sender, instance, **kwargs):
-    with transaction.atomic():
-        total_marks = Question.objects.filter(quiz=instance.quiz).aggregate(total_marks=models.Sum('marks'))['total_marks']
-        instance.quiz.total_marks = total_marks
-        instance.quiz.passing_marks = total_marks * 70/100
-        instance.quiz.save()
+def update_quiz_total_marks_on_delete(sender, instance, **kwargs):
+    recompute_quiz_totals(instance.quiz_id)
 
+#bulk grading (bulk_update) skips this and recomputes once per attempt instead
 @receiver(post_save, sender=AnswerAttempt)
 def update_quiz_attempt_marks_obtained(sender, instance, created, **kwargs):
     if not created:
-        with transaction.atomic():
-            marks_obtained = AnswerAttempt.objects.filter(quiz_attempt=instance.quiz_attempt, is_correct = True).aggregate(marks_obtained=Sum('question__marks'))['marks_obtained'] or 0
-            instance.quiz_attempt.marks_obtained = marks_obtained
-            if marks_obtained >= instance.quiz_attempt.quiz.passing_marks:
-                instance.quiz_attempt.qualified_status = QuizAttempt.QualifiedStatus.PASSED
-            else:
-                instance.quiz_attempt.qualified_status = QuizAttempt.QualifiedStatus.FAILED
-            instance.quiz_attempt.save()
+        recompute_quiz_attempt_scores([instance.quiz_attempt_id])
     
+
+
+#keeping Course.video_count and CourseProgressTracking.completed_count in step with the rows they count
+@receiver(post_save, sender=CourseVideo)
+def increment_course_video_count(sender, instance, created, **kwargs):
+    if created:
+        Course.all_objects.filter(id=instance.course_id).update(video_count=F("video_count") + 1)
+
+@receiver(pre_delete, sender=CourseVideo)
+def decrement_course_video_count(sender, instance, **kwargs):
+    # the cascade on the completed_videos through table doesn't send m2m_changed
+    CourseProgressTracking.objects.filter(completed_videos=instance).update(completed_count=F("completed_count") - 1)
+    Course.all_objects.filter(id=instance.course_id).update(video_count=F("video_count") - 1)
+
+@receiver(m2m_changed, sender=CourseProgressTracking.completed_videos.through)
+def update_completed_count(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear":
+        # pk_set is None for clear(), so record what is about to be removed
+        if reverse:
+            instance._cleared_progress_ids = list(instance.courseprogresstracking_set.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+
+    if not reverse:
+        if action == "post_clear":
+            CourseProgressTracking.objects.filter(id=instance.id).update(completed_count=0)
+        elif action == "post_add":
+            # add() leaves ids already present out of pk_set
+            CourseProgressTracking.objects.filter(id=instance.id).update(completed_count=F("completed_count") + len(pk_set))
+        else:
+            # remove() passes every id given, present or not: recount
+            CourseProgressTracking.objects.filter(id=instance.id).recount_completed()
+        instance.refresh_from_db(fields=["completed_count"])
+        return
+
+    # reverse side: instance is a CourseVideo and pk_set holds progress ids
+    if action == "post_clear":
+        CourseProgressTracking.objects.filter(id__in=instance._cleared_progress_ids).update(completed_count=F("completed_count") - 1)
+    elif action == "post_add":
+        CourseProgressTracking.objects.filter(id__in=pk_set).update(completed_count=F("completed_count") + 1)
+    else:
+        CourseProgressTracking.objects.filter(id__in=pk_set).recount_completed()
+
+
+#keeping the course search index current
+@receiver(post_save, sender=Course)
+def update_course_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not {"name", "description", "is_deleted"} & set(update_fields):
+        return
+    transaction.on_commit(lambda: get_search_backend().index(instance))
+    transaction.on_commit(lambda: get_name_index().index(instance))
+
+@receiver(post_delete, sender=Course)
+def remove_course_search_index(sender, instance, **kwargs):
+    transaction.on_commit(lambda: get_search_backend().remove(instance.id))
+    transaction.on_commit(lambda: get_name_index().remove(instance.id))
+
+
+#invalidating the cached course payloads (api/cache.py) once a change commits
+def invalidate_course_on_commit(course_id):
+    if course_id is not None:
+        transaction.on_commit(lambda: invalidate_course(course_id))
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course_cache(sender, instance, **kwargs):
+    invalidate_course_on_commit(instance.id)
+
+@receiver(post_save, sender=CourseComment)
+@receiver(post_delete, sender=CourseComment)
+@receiver(post_save, sender=CourseVideo)
+@receiver(post_delete, sender=CourseVideo)
+def invalidate_course_cache_for_related(sender, instance, **kwargs):
+    invalidate_course_on_commit(instance.course_id)
+
+@receiver(post_save, sender=CourseVideo)
+@receiver(post_delete, sender=CourseVideo)
+def invalidate_video_meta_cache(sender, instance, **kwargs):
+    video_id = instance.id
+    transaction.on_commit(lambda: invalidate_video_meta(video_id))
+
+@receiver(m2m_changed, sender=Course.instructors.through)
+def invalidate_course_cache_for_instructors(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        course_ids = [instance.id] if action in ("post_add", "post_remove", "post_clear") else []
+    # reverse side: instance is a User and pk_set holds course ids
+    elif action == "pre_clear":
+        instance._cleared_course_ids = list(instance.courses.values_list("id", flat=True))
+        return
+    elif action == "post_clear":
+        course_ids = instance._cleared_course_ids
+    elif action in ("post_add", "post_remove"):
+        course_ids = pk_set
+    else:
+        return
+    for course_id in course_ids:
+        invalidate_course_on_commit(course_id)
+        transaction.on_commit(lambda course_id=course_id: invalidate_course_membership(course_id))
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def invalidate_course_membership_cache(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_course_membership(instance.course_id))
+
+def invalidate_quiz_on_commit(quiz_id):
+    transaction.on_commit(lambda: invalidate_quiz(quiz_id))
+
+#answer options only change with their question (QuestionSerializer saves it)
+#and bulk imports invalidate the quiz themselves
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def invalidate_quiz_cache(sender, instance, **kwargs):
+    invalidate_quiz_on_commit(instance.id)
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_quiz_cache_for_question(sender, instance, **kwargs):
+    invalidate_quiz_on_commit(instance.quiz_id)
+
+#quiz payloads embed their video's title
+@receiver(post_save, sender=CourseVideo)
+def invalidate_quiz_cache_for_video(sender, instance, created, **kwargs):
+    if not created:
+        for quiz_id in Quiz.objects.filter(video=instance).values_list("id", flat=True):
+            invalidate_quiz_on_commit(quiz_id)
+
+#content addressed video files are shared between videos, so each video
+#releases its reference instead of deleting the file
+@receiver(post_save, sender=CourseVideo)
+def release_replaced_video_file(sender, instance, created, **kwargs):
+    old_video = getattr(instance, "_old_video", None)
+    if old_video and old_video != instance.video.name:
+        instance.video.storage.delete(old_video)
+    instance._old_video = instance.video.name
+
+@receiver(post_delete, sender=CourseVideo)
+def release_video_file(sender, instance, **kwargs):
+    if instance.video.name:
+        instance.video.storage.delete(instance.video.name)
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each distinct file once, under the SHA-256 of its content
+    (blobs/ab/cd/<digest><ext>), hashing it while it is written. Every save
+    takes a reference on the blob and delete() drops one; the file goes
+    after the last one is dropped and committed. References are counted in
+    the MediaBlob table, so they commit or roll back with the rows holding
+    them.
+
+    Names saved before this storage (no blob prefix) are read as usual and
+    left alone by delete().
+    """
+
+    prefix = "blobs"
+    block_size = 1024 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # the final name is the digest: equal names mean equal content
+        return name
+
+    def blob_name(self, digest, name):
+        extension = os.path.splitext(name)[1].lower()
+        return f"{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        digest = hashlib.sha256()
+        size = 0
+        if hasattr(content, "temporary_file_path"):
+            # already on disk (an upload spooled to a temp file): hash it,
+            # then move it into place rather than copy
+            temp_path = content.temporary_file_path()
+            with open(temp_path, "rb") as file:
+                for block in iter(lambda: file.read(self.block_size), b""):
+                    digest.update(block)
+                    size += len(block)
+            owns_temp = False
+        else:
+            temp_dir = self.path(f"{self.prefix}/tmp")
+            os.makedirs(temp_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+            with os.fdopen(fd, "wb") as file:
+                for block in content.chunks(self.block_size):
+                    digest.update(block)
+                    size += len(block)
+                    file.write(block)
+            owns_temp = True
+
+        name = self.blob_name(digest.hexdigest(), name)
+        path = self.path(name)
+        # the reference comes first: once it is held a pending reap can't
+        # remove the file, and one that already ran left no file to trust
+        MediaBlob.acquire(name, size)
+        if os.path.exists(path):
+            # fresh again, so remove_orphans leaves it to this transaction
+            os.utime(path)
+            if owns_temp:
+                os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if owns_temp:
+                os.replace(temp_path, path)
+            else:
+                file_move_safe(temp_path, path, allow_overwrite=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        return name
+
+    def delete(self, name):
+        from .models import MediaBlob
+
+        if not name or not name.startswith(f"{self.prefix}/"):
+            return
+        if MediaBlob.release(name):
+            # only once the dropped reference is committed, and only if no
+            # save of the same content took the blob back in between
+            delete_file = super().delete
+            transaction.on_commit(lambda: MediaBlob.reap(name, delete_file))
+
+    def remove_orphans(self, older_than):
+        """
+        Delete blob files without a MediaBlob row, and unreferenced blobs.
+        A file is moved into place before the transaction saving its row
+        commits: a rollback (Django has no hook for one) or a crash leaves
+        the file behind, as a crash after release() leaves a blob that was
+        never reaped. Only files last modified before older_than (a
+        timestamp) are touched, so transactions still running keep theirs.
+        Returns the number of files removed.
+        """
+        from .models import MediaBlob
+
+        candidates = {}
+        for directory, _, filenames in os.walk(self.path(self.prefix)):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if os.path.getmtime(path) < older_than:
+                    candidates[os.path.relpath(path, self.location).replace(os.sep, "/")] = path
+        blobs = {}
+        names = list(candidates)
+        for start in range(0, len(names), 1000):
+            blobs.update(MediaBlob.objects.filter(name__in=names[start : start + 1000]).values_list("name", "references"))
+        removed = 0
+        for name, path in candidates.items():
+            # a save may have taken the file back since it was listed
+            if name not in blobs and os.path.getmtime(path) < older_than:
+                os.remove(path)
+                removed += 1
+            elif not blobs[name] and MediaBlob.reap(name, super().delete):
+                removed += 1
+        return removed
+
+    def etag(self, name):
+        """Strong ETag of a blob (its digest), or None for other names."""
+        if name.startswith(f"{self.prefix}/"):
+            return '"%s"' % os.path.splitext(os.path.basename(name))[0]
+        return None
+
+
+def video_storage():
+    return storages["videos"]
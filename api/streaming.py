@@ -0,0 +1,151 @@
+import mimetypes
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class RangeFile:
+    """
+    Read-only window [start, start + length) over an open file. It keeps
+    fileno(), so a server's wsgi.file_wrapper can sendfile() the window
+    straight from the page cache (the file is already positioned at start
+    and Content-Length bounds the count); servers without one read through
+    read(), which never goes past the window.
+    """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, end inclusive, or None to serve
+    the whole file (no header, an unparsable one or several ranges).
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # suffix range: the last N bytes
+        length = int(last)
+        if not length:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable
+    if start > end:
+        return None
+    return start, end
+
+
+def file_etag(size, modified):
+    return f'"{int(modified.timestamp() * 1_000_000):x}-{size:x}"'
+
+
+def etag_matches(header, etag):
+    return any(tag.strip() in (etag, "*") for tag in header.split(","))
+
+
+def range_is_fresh(if_range, etag, modified):
+    # If-Range holds either an ETag or a date; anything else means the
+    # client's copy is stale and it gets the whole file
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    date = parse_http_date_safe(if_range)
+    return date is not None and date == int(modified.timestamp())
+
+
+def offload_response(field, content_type):
+    """
+    Empty response telling the front server to send the file itself
+    (settings.VIDEO_STREAM_OFFLOAD: "X-Accel-Redirect" for nginx, with the
+    internal location in VIDEO_STREAM_ACCEL_PREFIX, or "X-Sendfile"); the
+    server then answers Range and conditional requests on its own.
+    """
+    header = settings.VIDEO_STREAM_OFFLOAD
+    response = HttpResponse(content_type=content_type)
+    if header == "X-Accel-Redirect":
+        prefix = getattr(settings, "VIDEO_STREAM_ACCEL_PREFIX", "/protected-media/")
+        response[header] = prefix + quote(field.name)
+    else:
+        response[header] = field.path
+    return response
+
+
+def stream_file(request, field):
+    """
+    Serve a FileField with Range, If-Range, If-None-Match and
+    If-Modified-Since support, without reading it through Python when the
+    server supports sendfile().
+    """
+    content_type = mimetypes.guess_type(field.name)[0] or "application/octet-stream"
+    if getattr(settings, "VIDEO_STREAM_OFFLOAD", None):
+        return offload_response(field, content_type)
+
+    storage = field.storage
+    size = storage.size(field.name)
+    modified = storage.get_modified_time(field.name)
+    # content addressed storages name a strong ETag themselves
+    etag = getattr(storage, "etag", lambda name: None)(field.name) or file_etag(size, modified)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": http_date(modified.timestamp()),
+        "Cache-Control": "private, max-age=0, must-revalidate",
+    }
+
+    if_none_match = request.headers.get("If-None-Match")
+    if_modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    if (if_none_match and etag_matches(if_none_match, etag)) or (
+        not if_none_match and if_modified_since and if_modified_since >= int(modified.timestamp())
+    ):
+        return HttpResponse(status=304, headers=headers)
+
+    try:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    except RangeNotSatisfiable:
+        return HttpResponse(status=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range and not range_is_fresh(request.headers.get("If-Range"), etag, modified):
+        byte_range = None
+
+    start, end = byte_range or (0, size - 1)
+    length = max(end - start + 1, 0)
+    response = FileResponse(
+        RangeFile(storage.open(field.name, "rb"), start, length),
+        status=206 if byte_range else 200,
+        content_type=content_type,
+        headers=headers,
+    )
+    response["Content-Length"] = str(length)
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
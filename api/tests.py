@@ -1,3 +1,1407 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import struct
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+
+import numpy as np
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models.signals import post_save
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.analytics import item_statistics
+from api.cache import get_cache, get_stats
+from api.grading import recompute_quiz_attempt_scores
+from api.heartbeats import watch_positions
+from api.models import (
+    Answer,
+    AnswerAttempt,
+    Course,
+    CourseComment,
+    CourseLike,
+    CourseLikeCounter,
+    CourseProgressTracking,
+    CourseRating,
+    CourseVideo,
+    Enrollment,
+    MediaBlob,
+    Question,
+    Quiz,
+    QuizAttempt,
+    User,
+    VideoUploadSession,
+    VideoWatchPosition,
+)
+from api.permissions import IsAdminOrInstructorOrStudentRelatedToCourse, IsStudentRelatedToCourse
+from api.probe import ProbeError, probe
+from api.search import CourseNameIndex, InvertedIndexSearchBackend
+from api.serializer import CourseProgressTrackingSerializer, CourseSerializer
+from api.uploads import UploadGone, finalize, write_chunk
+
+
+class CourseQueryCountTests(TestCase):
+
+    def setUp(self):
+        self.instructor = User.objects.create_user(
+            username="instructor", email="instructor@example.com", password="password", role="instructor"
+        )
+        self.co_instructor = User.objects.create_user(
+            username="co_instructor", email="co_instructor@example.com", password="password", role="instructor"
+        )
+        self.student = User.objects.create_user(
+            username="student", email="student@example.com", password="password"
+        )
+        self.client = APIClient()
+        get_cache().clear()
+
+    def create_courses(self, count):
+        courses = []
+        for i in range(count):
+            course = Course.objects.create(name=f"Course {i}", description="description")
+            course.instructors.set([self.instructor, self.co_instructor])
+            CourseComment.objects.create(course=course, user=self.student, content="first")
+            CourseComment.objects.create(course=course, user=self.instructor, content="second")
+            courses.append(course)
+        return courses
+
+    def test_instructor_courses_query_count_is_constant(self):
+        self.create_courses(5)
+        self.client.force_authenticate(self.instructor)
+        # count, courses, instructors, comments with their users
+        with self.assertNumQueries(4):
+            response = self.client.get("/api/Instructor_courses/?limit=5")
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len(results[0]["comments"]), 2)
+        self.assertEqual(
+            results[0]["instructors"],
+            [
+                {"id": self.instructor.id, "username": "instructor"},
+                {"id": self.co_instructor.id, "username": "co_instructor"},
+            ],
+        )
+
+    def test_course_detail_query_count(self):
+        course = self.create_courses(1)[0]
+        self.client.force_authenticate(self.student)
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/api/course/{course.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["comments"][0]["user"]["username"], "instructor")
+
+
+class EnrollmentQueryCountTests(TestCase):
+
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            username="admin", email="admin@example.com", password="password", role="admin"
+        )
+        self.instructor = User.objects.create_user(
+            username="instructor", email="instructor@example.com", password="password", role="instructor"
+        )
+        course = Course.objects.create(name="Course", description="description")
+        for i in range(5):
+            student = User.objects.create_user(
+                username=f"student{i}", email=f"student{i}@example.com", password="password"
+            )
+            Enrollment.objects.create(
+                course=course, student=student, instructor=self.instructor if i % 2 else None
+            )
+        self.client = APIClient()
+
+    def test_admin_enrollment_listing_is_single_query(self):
+        self.client.force_authenticate(self.admin)
+        # count and page
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/enrollment/?limit=5")
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual(len(results), 5)
+        self.assertEqual(
+            list(results[1]), ["id", "student", "instructor", "course", "status"]
+        )
+        self.assertEqual(results[0]["instructor"], None)
+        self.assertEqual(
+            results[1]["instructor"], {"id": self.instructor.id, "username": "instructor"}
+        )
+        self.assertEqual(results[1]["course"]["name"], "Course")
+
+    def test_keyset_pagination_walks_every_row_once(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get("/api/enrollment/?pagination=cursor&limit=2")
+        seen = [row["id"] for row in response.data["results"]]
+        while response.data["next"]:
+            with self.assertNumQueries(1):
+                response = self.client.get(response.data["next"])
+            seen.extend(row["id"] for row in response.data["results"])
+        self.assertEqual(seen, sorted(Enrollment.objects.values_list("id", flat=True)))
+
+    def test_keyset_pagination_rejects_unknown_ordering(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get("/api/enrollment/?pagination=cursor&ordering=status")
+        self.assertEqual(response.status_code, 400)
+
+
+class CourseProgressCountTests(TestCase):
+
+    def setUp(self):
+        self.course = Course.objects.create(name="Course", description="description")
+        self.videos = [
+            CourseVideo.objects.create(course=self.course, title=f"Video {i}", video=f"videos/{i}.mp4")
+            for i in range(4)
+        ]
+        self.students = [
+            User.objects.create_user(username=f"student{i}", email=f"student{i}@example.com", password="password")
+            for i in range(3)
+        ]
+        self.progress = [
+            CourseProgressTracking.objects.create(student=student, course=self.course)
+            for student in self.students
+        ]
+
+    def completed_count(self, progress):
+        return CourseProgressTracking.objects.get(id=progress.id).completed_count
+
+    def test_counts_follow_completed_videos_changes(self):
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.video_count, 4)
+
+        progress = self.progress[0]
+        progress.completed_videos.add(*self.videos[:3])
+        self.assertEqual(self.completed_count(progress), 3)
+        progress.completed_videos.add(self.videos[0])
+        self.assertEqual(self.completed_count(progress), 3)
+        progress.completed_videos.set(self.videos[1:])
+        self.assertEqual(self.completed_count(progress), 3)
+        progress.completed_videos.remove(self.videos[3])
+        self.assertEqual(self.completed_count(progress), 2)
+        # ids that aren't in the relation change nothing
+        progress.completed_videos.remove(self.videos[0], self.videos[3])
+        self.assertEqual(self.completed_count(progress), 2)
+        self.videos[0].courseprogresstracking_set.remove(self.progress[1])
+        self.assertEqual(self.completed_count(self.progress[1]), 0)
+
+        self.videos[1].courseprogresstracking_set.add(self.progress[1])
+        self.assertEqual(self.completed_count(self.progress[1]), 1)
+        self.videos[1].courseprogresstracking_set.clear()
+        self.assertEqual(self.completed_count(progress), 1)
+        self.assertEqual(self.completed_count(self.progress[1]), 0)
+
+        self.videos[2].delete()
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.video_count, 3)
+        self.assertEqual(self.completed_count(progress), 0)
+
+        progress.completed_videos.add(self.videos[0])
+        progress.completed_videos.clear()
+        self.assertEqual(self.completed_count(progress), 0)
+
+    def test_progress_listing_query_count_is_constant(self):
+        for progress in self.progress:
+            progress.completed_videos.add(*self.videos[:2])
+        # progress joined with student and course, completed videos, course videos
+        with self.assertNumQueries(3):
+            data = CourseProgressTrackingSerializer(
+                CourseProgressTracking.objects.for_listing(), many=True
+            ).data
+        self.assertEqual(data[0]["completion_percentage"], 50)
+        self.assertEqual(len(data[0]["remaining_videos"]), 2)
+        self.assertEqual(len(data[0]["completed_videos"]), 2)
+
+    def test_instructor_progress_matrix(self):
+        instructor = User.objects.create_user(
+            username="instructor", email="instructor@example.com", password="password", role="instructor"
+        )
+        self.course.instructors.add(instructor)
+        for student in self.students[:2]:
+            Enrollment.objects.create(
+                course=self.course, student=student, instructor=instructor, status="approved"
+            )
+        self.progress[0].completed_videos.add(self.videos[0], self.videos[3])
+        self.progress[1].completed_videos.add(self.videos[3])
+        self.progress[2].completed_videos.add(self.videos[3])
+        # a video of another course, which the progress endpoints don't prevent
+        other = Course.objects.create(name="Other", description="description")
+        self.progress[0].completed_videos.add(CourseVideo.objects.create(course=other, title="Other", video="videos/other.mp4"))
+
+        client = APIClient()
+        client.force_authenticate(instructor)
+        response = client.get(f"/api/instructor_course_progress_matrix/{self.course.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["videos"], [video.id for video in self.videos])
+        self.assertEqual(response.data["video_completions"], [1, 0, 0, 2])
+        students = {row["id"]: row for row in response.data["students"]}
+        self.assertEqual(set(students), {self.students[0].id, self.students[1].id})
+        self.assertEqual(base64.b64decode(students[self.students[0].id]["completed"]), bytes([0b1001]))
+        self.assertEqual(students[self.students[1].id]["completed_count"], 1)
+
+
+class InvertedIndexSearchTests(TestCase):
+
+    def setUp(self):
+        self.python = Course.objects.create(name="Python basics", description="Learn programming step by step")
+        self.django = Course.objects.create(name="Web development", description="Django and Python for the web")
+        self.cooking = Course.objects.create(name="Cooking", description="Knife skills and sauces")
+        self.backend = InvertedIndexSearchBackend()
+
+    def test_ranks_name_matches_first(self):
+        self.assertEqual(
+            list(self.backend.search("python", 10)), [self.python, self.django]
+        )
+        self.assertEqual(list(self.backend.search("astronomy", 10)), [])
+
+    def test_index_and_remove_are_incremental(self):
+        self.backend.build()
+        self.cooking.description = "Python scripting for kitchen timers"
+        self.backend.index(self.cooking)
+        self.assertIn(self.cooking, self.backend.search("kitchen", 10))
+        self.cooking.delete()
+        self.backend.index(self.cooking)
+        self.assertEqual(list(self.backend.search("kitchen", 10)), [])
+        self.backend.remove(self.python.id)
+        self.assertEqual(list(self.backend.search("python", 10)), [self.django])
+
+
+class CourseNameIndexTests(TestCase):
+
+    def test_completes_any_word_prefix(self):
+        intro = Course.objects.create(name="Intro to Python", description="")
+        data = Course.objects.create(name="Python for Data", description="")
+        Course.objects.create(name="Cooking", description="")
+        index = CourseNameIndex()
+        self.assertEqual(index.complete("py", 10), [(intro.id, "Intro to Python"), (data.id, "Python for Data")])
+        self.assertEqual(index.complete("to py", 10), [(intro.id, "Intro to Python")])
+        self.assertEqual(index.complete("py", 1), [(intro.id, "Intro to Python")])
+
+        data.name = "Statistics"
+        index.index(data)
+        self.assertEqual(index.complete("py", 10), [(intro.id, "Intro to Python")])
+        self.assertEqual(index.complete("stat", 10), [(data.id, "Statistics")])
+        index.remove(intro.id)
+        self.assertEqual(index.complete("py", 10), [])
+
+
+class CourseCacheTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.student = User.objects.create_user(
+            username="student", email="student@example.com", password="password"
+        )
+        self.instructor = User.objects.create_user(
+            username="instructor", email="instructor@example.com", password="password", role="instructor"
+        )
+        self.course = Course.objects.create(name="Course", description="description")
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def test_detail_is_served_from_cache_until_invalidated(self):
+        url = f"/api/course/{self.course.id}/"
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data["comments"], [])
+        self.assertEqual(get_stats(), {"hits": 1, "misses": 1})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CourseComment.objects.create(course=self.course, user=self.student, content="hello")
+        self.assertEqual(len(self.client.get(url).data["comments"]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.instructor.courses.add(self.course)
+        self.assertEqual(self.client.get(url).data["instructors"][0]["username"], "instructor")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.course.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_listing_is_invalidated_by_course_changes(self):
+        self.assertEqual(self.client.get("/api/course/").data["count"], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(name="Another", description="description")
+        self.assertEqual(self.client.get("/api/course/").data["count"], 2)
+
+
+class CourseMembershipPermissionTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.student = User.objects.create_user(
+            username="student", email="student@example.com", password="password"
+        )
+        self.course = Course.objects.create(name="Course", description="description")
+        self.enrollment = Enrollment.objects.create(course=self.course, student=self.student, status="approved")
+
+    def test_membership_is_loaded_once_per_request_and_cached(self):
+        request = SimpleNamespace(user=self.student)
+        with self.assertNumQueries(1):
+            self.assertTrue(IsStudentRelatedToCourse().has_object_permission(request, None, self.course))
+            self.assertTrue(
+                IsAdminOrInstructorOrStudentRelatedToCourse().has_object_permission(request, None, self.course)
+            )
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                IsStudentRelatedToCourse().has_object_permission(SimpleNamespace(user=self.student), None, self.course)
+            )
+
+    def test_enrollment_change_invalidates_membership(self):
+        self.assertTrue(
+            IsStudentRelatedToCourse().has_object_permission(SimpleNamespace(user=self.student), None, self.course)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.enrollment.status = "rejected"
+            self.enrollment.save()
+        self.assertFalse(
+            IsStudentRelatedToCourse().has_object_permission(SimpleNamespace(user=self.student), None, self.course)
+        )
+
+
+class CourseLikeCounterTests(TestCase):
+
+    def test_likes_are_consolidated_into_course(self):
+        course = Course.objects.create(name="Course", description="description")
+        users = [
+            User.objects.create_user(username=f"user{i}", email=f"user{i}@example.com", password="password")
+            for i in range(5)
+        ]
+        likes = [CourseLike.objects.create(course=course, user=user) for user in users]
+        likes[0].delete()
+        self.assertEqual(CourseLikeCounter.consolidate(), [course.id])
+        course.refresh_from_db()
+        self.assertEqual(course.likes, 4)
+        self.assertFalse(CourseLikeCounter.objects.exclude(count=0).exists())
+        self.assertEqual(CourseLikeCounter.consolidate(), [])
+
+
+class CourseRatingAggregateTests(TestCase):
+
+    def setUp(self):
+        self.course = Course.objects.create(name="Course", description="description")
+        self.users = [
+            User.objects.create_user(username=f"user{i}", email=f"user{i}@example.com", password="password")
+            for i in range(3)
+        ]
+
+    def test_aggregates_and_histogram_stay_exact(self):
+        # the rating insert and one UPDATE of the course, in a savepoint
+        with self.assertNumQueries(4):
+            first = CourseRating.objects.create(course=self.course, user=self.users[0], rating=5)
+        CourseRating.objects.create(course=self.course, user=self.users[1], rating=4)
+        CourseRating.objects.create(course=self.course, user=self.users[2], rating=4)
+
+        rating = CourseRating.objects.get(id=first.id)
+        rating.rating = 1
+        # savepoint, the locked read of the stored rating, both UPDATEs, release
+        with self.assertNumQueries(5):
+            rating.save()
+        CourseRating.objects.get(user=self.users[1]).delete()
+
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.total_ratings, 2)
+        self.assertEqual(self.course.rating_sum, 5)
+        self.assertEqual(self.course.rating, 2.5)
+        self.assertEqual(
+            CourseSerializer(self.course).data["rating_histogram"],
+            {"1": 1, "2": 0, "3": 0, "4": 1, "5": 0},
+        )
+
+        CourseRating.objects.all().delete()
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.total_ratings, self.course.rating_sum, self.course.rating), (0, 0, 0.0))
+
+    def test_failed_save_leaves_the_aggregates_alone(self):
+        def fail(**kwargs):
+            raise RuntimeError("database went away")
+
+        # runs after the aggregate UPDATE
+        post_save.connect(fail, sender=CourseRating)
+        try:
+            with self.assertRaises(RuntimeError):
+                CourseRating.objects.create(course=self.course, user=self.users[0], rating=5)
+        finally:
+            post_save.disconnect(fail, sender=CourseRating)
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.total_ratings, self.course.rating_sum), (0, 0))
+        self.assertFalse(CourseRating.objects.exists())
+
+    def test_stale_instances_replace_the_stored_rating(self):
+        CourseRating.objects.create(course=self.course, user=self.users[0], rating=5)
+        # two requests editing the same rating, both loaded before either saved
+        first, second = CourseRating.objects.get(), CourseRating.objects.get()
+        first.rating = 1
+        first.save()
+        second.rating = 3
+        second.save()
+        first.delete()
+        second.delete()
+        self.course.refresh_from_db()
+        self.assertEqual((self.course.total_ratings, self.course.rating_sum), (0, 0))
+        self.assertEqual(CourseSerializer(self.course).data["rating_histogram"], dict.fromkeys("12345", 0))
+
+
+class QuizSubmissionTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.student = User.objects.create_user(
+            username="student", email="student@example.com", password="password"
+        )
+        self.course = Course.objects.create(name="Course", description="description")
+        Enrollment.objects.create(course=self.course, student=self.student, status="approved")
+        self.video = CourseVideo.objects.create(course=self.course, title="Video", video="videos/1.mp4")
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def create_quiz(self, questions):
+        quiz = Quiz.objects.create(video=self.video, title="Quiz", description="description")
+        Question.objects.bulk_create([Question(quiz=quiz, question=f"Q{i}") for i in range(questions)])
+        return quiz
+
+    def submit(self, quiz, question_ids):
+        return self.client.post(
+            "/api/quiz_attempt/",
+            {"quiz": quiz.id, "answers": [{"question": i, "answer": "yes"} for i in question_ids]},
+            format="json",
+        )
+
+    def test_query_count_does_not_depend_on_quiz_length(self):
+        counts = []
+        for questions in (5, 50):
+            quiz = self.create_quiz(questions)
+            question_ids = list(quiz.questions.values_list("id", flat=True))
+            get_cache().clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.submit(quiz, question_ids)
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(AnswerAttempt.objects.filter(quiz_attempt__quiz=quiz).count(), 50)
+        self.assertEqual(QuizAttempt.objects.get(quiz=quiz).student, self.student)
+
+    def test_rejects_missing_duplicate_and_foreign_questions(self):
+        quiz = self.create_quiz(3)
+        other = self.create_quiz(1)
+        ids = list(quiz.questions.values_list("id", flat=True))
+        foreign = other.questions.get().id
+        for question_ids in (ids[:2], ids + ids[:1], ids[:2] + [foreign]):
+            self.assertEqual(self.submit(quiz, question_ids).status_code, 400)
+        self.assertFalse(QuizAttempt.objects.exists())
+
+
+class QuizGradingTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.instructor = User.objects.create_user(
+            username="instructor", email="instructor@example.com", password="password", role="instructor"
+        )
+        self.student = User.objects.create_user(
+            username="student", email="student@example.com", password="password"
+        )
+        self.course = Course.objects.create(name="Course", description="description")
+        self.course.instructors.add(self.instructor)
+        Enrollment.objects.create(
+            course=self.course, student=self.student, instructor=self.instructor, status="approved"
+        )
+        self.video = CourseVideo.objects.create(course=self.course, title="Video", video="videos/1.mp4")
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def create_attempt(self, questions):
+        quiz = Quiz.objects.create(video=self.video, title="Quiz", description="description")
+        for i in range(questions):
+            Question.objects.create(quiz=quiz, question=f"Q{i}", marks=2)
+        attempt = QuizAttempt.objects.create(quiz=quiz, student=self.student)
+        AnswerAttempt.objects.bulk_create(
+            [AnswerAttempt(quiz_attempt=attempt, question=question, answer="yes") for question in quiz.questions.all()]
+        )
+        return attempt
+
+    def grade(self, attempt, correct):
+        answers = list(attempt.answers.order_by("id").values_list("id", flat=True))
+        return self.client.put(
+            f"/api/quiz_attempt/{attempt.id}/",
+            {"answers": [{"id": answer, "is_correct": i < correct} for i, answer in enumerate(answers)]},
+            format="json",
+        )
+
+    def test_grading_recomputes_score_once_in_constant_queries(self):
+        counts = []
+        for questions in (5, 50):
+            attempt = self.create_attempt(questions)
+            get_cache().clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.grade(attempt, correct=questions - 1)
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.marks_obtained, 98)
+        self.assertEqual(attempt.qualified_status, "passed")
+        self.assertEqual(response.data["qualified_status"], "passed")
+
+    def test_grading_rejects_incomplete_answer_set(self):
+        attempt = self.create_attempt(3)
+        answer = attempt.answers.first()
+        response = self.client.put(
+            f"/api/quiz_attempt/{attempt.id}/",
+            {"answers": [{"id": answer.id, "is_correct": True}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def grade_question(self, question, answers, correct=True):
+        return self.client.post(
+            f"/api/quiz_question_grades/{question.id}/",
+            {"grades": {str(answer.id): correct for answer in answers}},
+            format="json",
+        )
+
+    def test_question_grading_across_attempts_in_constant_queries(self):
+        quiz = Quiz.objects.create(video=self.video, title="Quiz", description="description")
+        question = Question.objects.create(quiz=quiz, question="Q", marks=2)
+        counts = []
+        for students in (2, 20):
+            answers = []
+            for i in range(students):
+                student = User.objects.create_user(
+                    username=f"student{students}-{i}", email=f"s{students}-{i}@example.com", password="password"
+                )
+                Enrollment.objects.create(
+                    course=self.course, student=student, instructor=self.instructor, status="approved"
+                )
+                attempt = QuizAttempt.objects.create(quiz=quiz, student=student)
+                answers.append(AnswerAttempt.objects.create(quiz_attempt=attempt, question=question, answer="yes"))
+            get_cache().clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.grade_question(question, answers)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["graded"], students)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        attempt = answers[0].quiz_attempt
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.marks_obtained, 2)
+        self.assertEqual(attempt.qualified_status, "passed")
+
+    def test_question_grading_rejects_other_instructors_students(self):
+        other = User.objects.create_user(
+            username="other", email="other@example.com", password="password", role="instructor"
+        )
+        self.course.instructors.add(other)
+        attempt = self.create_attempt(1)
+        answers = list(attempt.answers.all())
+        self.client.force_authenticate(other)
+        response = self.grade_question(answers[0].question, answers)
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(AnswerAttempt.objects.filter(is_correct=True).exists())
+
+
+class AutoGradingTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.instructor = User.objects.create_user(
+            username="instructor", email="instructor@example.com", password="password", role="instructor"
+        )
+        self.student = User.objects.create_user(
+            username="student", email="student@example.com", password="password"
+        )
+        self.course = Course.objects.create(name="Course", description="description")
+        self.course.instructors.add(self.instructor)
+        Enrollment.objects.create(
+            course=self.course, student=self.student, instructor=self.instructor, status="approved"
+        )
+        video = CourseVideo.objects.create(course=self.course, title="Video", video="videos/1.mp4")
+        self.quiz = Quiz.objects.create(video=video, title="Quiz", description="description", passing_marks=5)
+        self.client = APIClient()
+
+    def create_question(self, question_type, options, marks=2):
+        self.client.force_authenticate(self.instructor)
+        response = self.client.post(
+            "/api/quiz_question/",
+            {
+                "quiz": self.quiz.id,
+                "question": "Q",
+                "question_type": question_type,
+                "marks": marks,
+                "options": [{"answer": answer, "is_correct": correct} for answer, correct in options],
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["id"]
+
+    def submit(self, answers):
+        self.client.force_authenticate(self.student)
+        response = self.client.post(
+            "/api/quiz_attempt/",
+            {"quiz": self.quiz.id, "answers": [{"question": q, "answer": a} for q, a in answers.items()]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return QuizAttempt.objects.get(quiz=self.quiz, student=self.student)
+
+    def test_submission_is_graded_against_answer_keys(self):
+        tf = self.create_question("TF", [("True", True), ("False", False)])
+        option = self.create_question("OPTION", [("Paris", True), ("Rome", False)])
+        mcq = self.create_question("MCQ", [("2", True), ("3", True), ("4", False)])
+        attempt = self.submit({tf: " yes", option: "paris ", mcq: ["3", "2"]})
+        self.assertEqual(attempt.marks_obtained, 6)
+        self.assertEqual(attempt.qualified_status, "passed")
+
+        attempt.delete()
+        attempt = self.submit({tf: "true", option: "Rome", mcq: ["2"]})
+        self.assertEqual(attempt.marks_obtained, 2)
+        self.assertEqual(attempt.qualified_status, "failed")
+        self.assertEqual(attempt.answers.filter(is_correct=True).get().question_id, tf)
+
+    def test_text_questions_leave_the_attempt_to_the_instructor(self):
+        tf = self.create_question("TF", [("true", False), ("false", True)])
+        text = self.create_question("Text", [])
+        attempt = self.submit({tf: "false", text: "because"})
+        self.assertEqual(attempt.qualified_status, "pending")
+        self.assertTrue(attempt.answers.get(question=tf).is_correct)
+
+    def test_invalid_answer_keys_are_rejected(self):
+        self.client.force_authenticate(self.instructor)
+        for question_type, options in [
+            ("TF", [("true", True), ("maybe", False)]),
+            ("OPTION", [("a", True), ("b", True)]),
+            ("MCQ", [("a", False), ("b", False)]),
+            ("MCQ", [("a", True), (" A", False)]),
+        ]:
+            response = self.client.post(
+                "/api/quiz_question/",
+                {
+                    "quiz": self.quiz.id,
+                    "question": "Q",
+                    "question_type": question_type,
+                    "options": [{"answer": answer, "is_correct": correct} for answer, correct in options],
+                },
+                format="json",
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(Answer.objects.exists())
+
+    def test_students_do_not_see_the_answer_key(self):
+        question = self.create_question("OPTION", [("a", True), ("b", False)])
+        self.client.force_authenticate(self.student)
+        response = self.client.get(f"/api/quiz_question/{question}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([option["answer"] for option in response.data["options"]], ["a", "b"])
+        self.assertNotIn("is_correct", response.data["options"][0])
+
+
+class QuestionImportTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.instructor = User.objects.create_user(
+            username="instructor", email="instructor@example.com", password="password", role="instructor"
+        )
+        course = Course.objects.create(name="Course", description="description")
+        course.instructors.add(self.instructor)
+        self.video = CourseVideo.objects.create(course=course, title="Video", video="videos/1.mp4")
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def import_json(self, quiz, questions):
+        return self.client.post(f"/api/quiz_question_import/{quiz.id}/", {"questions": questions}, format="json")
+
+    def test_json_import_recomputes_totals_once(self):
+        counts = []
+        for size in (20, 200):
+            quiz = Quiz.objects.create(video=self.video, title="Quiz", description="description")
+            questions = [
+                {"question": f"Q{i}", "question_type": "TF", "marks": 2, "options": [{"answer": "true", "is_correct": True}]}
+                for i in range(size)
+            ]
+            get_cache().clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.import_json(quiz, questions)
+            self.assertEqual(response.status_code, 201, response.data)
+            counts.append(len(queries))
+        # one more batch of inserts for the larger import
+        self.assertLessEqual(counts[1] - counts[0], 2)
+        self.assertEqual(response.data, {"imported": 200, "total_marks": 400, "passing_marks": 280})
+        self.assertEqual(Answer.objects.filter(question__quiz=quiz).count(), 200)
+
+    def test_csv_import(self):
+        quiz = Quiz.objects.create(video=self.video, title="Quiz", description="description")
+        upload = SimpleUploadedFile(
+            "questions.csv",
+            b"question,question_type,marks,options,correct\n"
+            b"Is the sky blue?,TF,1,true|false,true\n"
+            b'"What is 2+2, roughly?",OPTION,3,3|4|5,4\n'
+            b"Explain,Text,2,,\n",
+        )
+        response = self.client.post(f"/api/quiz_question_import/{quiz.id}/", {"file": upload})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["total_marks"], 6)
+        option = quiz.questions.get(question_type="OPTION")
+        self.assertEqual(option.question, "What is 2+2, roughly?")
+        self.assertEqual(option.options.get(is_correct=True).answer, "4")
+
+    def test_unreadable_csv_is_rejected(self):
+        quiz = Quiz.objects.create(video=self.video, title="Quiz", description="description")
+        for content, row, message in (
+            # a Latin-1 export
+            ("question,question_type,marks\nWhat is 2+2?,Text,1\nCafé?,Text,1\n".encode("latin-1"), 2, "UTF-8"),
+            (b"question,question_type,marks\n" + b"x" * 200_000 + b",Text,1\n", 1, "Malformed CSV"),
+        ):
+            upload = SimpleUploadedFile("questions.csv", content)
+            response = self.client.post(f"/api/quiz_question_import/{quiz.id}/", {"file": upload})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data["errors"], [{"row": row, "errors": response.data["errors"][0]["errors"]}])
+            self.assertIn(message, response.data["errors"][0]["errors"])
+        self.assertFalse(quiz.questions.exists())
+
+    def test_json_and_jsonl_files(self):
+        questions = [
+            {"question": "Is the sky blue?", "question_type": "TF", "marks": 5, "options": [{"answer": "true", "is_correct": True}]},
+            {"question": "Explain", "marks": 6},
+        ]
+        for name, content in (
+            ("questions.json", json.dumps(questions, indent=2)),
+            ("questions.jsonl", "\n".join(json.dumps(question) for question in questions)),
+        ):
+            quiz = Quiz.objects.create(video=self.video, title="Quiz", description="description")
+            upload = SimpleUploadedFile(name, content.encode())
+            response = self.client.post(f"/api/quiz_question_import/{quiz.id}/", {"file": upload})
+            self.assertEqual(response.status_code, 201, response.data)
+            # 70% of 11, rounded
+            self.assertEqual((response.data["imported"], response.data["passing_marks"]), (2, 8))
+
+        upload = SimpleUploadedFile("questions.json", b'{"question": "Q"}')
+        response = self.client.post(f"/api/quiz_question_import/{quiz.id}/", {"file": upload})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_rows_import_nothing(self):
+        quiz = Quiz.objects.create(video=self.video, title="Quiz", description="description")
+        response = self.import_json(
+            quiz,
+            [{"question": "Q1"}, {"question": "Q2", "question_type": "MCQ", "options": []}, "Q3"],
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["row"] for error in response.data["errors"]], [2, 3])
+        self.assertFalse(quiz.questions.exists())
+
+    def test_deleting_the_last_question_resets_totals(self):
+        quiz = Quiz.objects.create(video=self.video, title="Quiz", description="description")
+        question = Question.objects.create(quiz=quiz, question="Q", marks=4)
+        quiz.refresh_from_db()
+        self.assertEqual((quiz.total_marks, quiz.passing_marks), (4, 3))
+        question.delete()
+        quiz.refresh_from_db()
+        self.assertEqual((quiz.total_marks, quiz.passing_marks), (0, 0))
+
+
+class QuizPayloadCacheTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.student = User.objects.create_user(
+            username="student", email="student@example.com", password="password"
+        )
+        course = Course.objects.create(name="Course", description="description")
+        Enrollment.objects.create(course=course, student=self.student, status="approved")
+        video = CourseVideo.objects.create(course=course, title="Video", video="videos/1.mp4")
+        self.quiz = Quiz.objects.create(video=video, title="Quiz", description="description")
+        self.question = Question.objects.create(quiz=self.quiz, question="Q", question_type="OPTION")
+        Answer.objects.create(question=self.question, answer="a", is_correct=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def get_quiz(self):
+        response = self.client.get(f"/api/quiz/{self.quiz.id}/")
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)
+
+    def test_repeated_starts_are_served_from_cache(self):
+        data = self.get_quiz()
+        self.assertEqual(data["questions"][0]["options"], [{"id": self.question.options.get().id, "answer": "a"}])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get_quiz(), data)
+        # counted apart from the course cache
+        self.assertEqual(get_stats("quiz"), {"hits": 1, "misses": 1})
+        self.assertEqual(get_stats(), {"hits": 0, "misses": 0})
+
+    def test_question_changes_invalidate_the_payload(self):
+        self.get_quiz()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.question.question = "Changed"
+            self.question.save()
+        self.assertEqual(self.get_quiz()["questions"][0]["question"], "Changed")
+
+    def test_cached_payload_still_checks_membership(self):
+        self.get_quiz()
+        outsider = User.objects.create_user(username="outsider", email="outsider@example.com", password="password")
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.get(f"/api/quiz/{self.quiz.id}/").status_code, 403)
+
+
+class QuizAnalyticsTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.instructor = User.objects.create_user(
+            username="instructor", email="instructor@example.com", password="password", role="instructor"
+        )
+        course = Course.objects.create(name="Course", description="description")
+        course.instructors.add(self.instructor)
+        video = CourseVideo.objects.create(course=course, title="Video", video="videos/1.mp4")
+        self.quiz = Quiz.objects.create(video=video, title="Quiz", description="description")
+        self.questions = [Question.objects.create(quiz=self.quiz, question=f"Q{i}", marks=1) for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def add_attempt(self, correct):
+        student = User.objects.create_user(
+            username=f"student{QuizAttempt.objects.count()}", email=f"s{QuizAttempt.objects.count()}@example.com"
+        )
+        attempt = QuizAttempt.objects.create(quiz=self.quiz, student=student)
+        AnswerAttempt.objects.bulk_create(
+            [
+                AnswerAttempt(quiz_attempt=attempt, question=question, answer="a", is_correct=is_correct)
+                for question, is_correct in zip(self.questions, correct)
+            ]
+        )
+        recompute_quiz_attempt_scores([attempt.id])
+
+    def test_item_statistics(self):
+        correct = np.array([[1, 1, 0], [1, 0, 0], [1, 1, 1], [0, 0, 1]], dtype=bool)
+        p_values, point_biserial, totals = item_statistics(correct, np.array([1.0, 1.0, 1.0]))
+        self.assertEqual(p_values.tolist(), [0.75, 0.5, 0.5])
+        self.assertEqual(totals.tolist(), [2, 1, 3, 1])
+        rest = totals - correct[:, 1]
+        self.assertAlmostEqual(point_biserial[1], np.corrcoef(correct[:, 1], rest)[0, 1])
+
+        # the last two attempts predate the third question: it is judged on the first two only
+        answered = np.ones_like(correct)
+        answered[2:, 2] = False
+        p_values, point_biserial, totals = item_statistics(correct, np.array([1.0, 1.0, 1.0]), answered)
+        self.assertEqual(p_values.tolist(), [0.75, 0.5, 0.0])
+        self.assertEqual(totals.tolist(), [2, 1, 2, 0])
+        self.assertTrue(np.isnan(point_biserial[2]))
+
+    def test_statistics_are_cached_until_new_attempts(self):
+        for correct in ([1, 1, 0], [1, 0, 0], [1, 1, 1]):
+            self.add_attempt(correct)
+        response = self.client.get(f"/api/quiz_analytics/{self.quiz.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["attempts"], 3)
+        self.assertEqual([q["p_value"] for q in response.data["questions"]], [1.0, 0.6667, 0.3333])
+        # every attempt got the first question right: no discrimination to measure
+        self.assertIsNone(response.data["questions"][0]["point_biserial"])
+        self.assertEqual(response.data["pass_rate"], 0.6667)
+        self.assertEqual(sum(bucket["count"] for bucket in response.data["score_distribution"]), 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(f"/api/quiz_analytics/{self.quiz.id}/").data, response.data)
+        self.assertFalse(any("api_answerattempt" in query["sql"] for query in queries.captured_queries))
+
+        self.add_attempt([0, 0, 0])
+        self.assertEqual(self.client.get(f"/api/quiz_analytics/{self.quiz.id}/").data["attempts"], 4)
+
+
+class CourseVideoOrderTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.instructor = User.objects.create_user(
+            username="instructor", email="instructor@example.com", password="password", role="instructor"
+        )
+        self.course = Course.objects.create(name="Course", description="description")
+        self.course.instructors.add(self.instructor)
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+
+    def test_orders_continue_from_the_last_video(self):
+        first = CourseVideo.objects.create(course=self.course, title="1", video="videos/1.mp4")
+        second = CourseVideo.objects.create(course=self.course, title="2", video="videos/2.mp4")
+        self.assertEqual((first.order, second.order), (1, 2))
+
+    def test_bulk_create_appends_in_upload_order(self):
+        CourseVideo.objects.create(course=self.course, title="intro", video="videos/intro.mp4")
+        files = [SimpleUploadedFile(f"{i}.mp4", b"video") for i in range(3)]
+        with self.settings(MEDIA_ROOT=tempfile.mkdtemp()):
+            response = self.client.post(
+                f"/api/course-videos/{self.course.id}/", {"title": ["a", "b", "c"], "video": files}
+            )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual([(video["title"], video["order"]) for video in response.data], [("a", 2), ("b", 3), ("c", 4)])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.video_count, 4)
+
+    def test_reorder_rewrites_orders_in_one_update(self):
+        videos = [CourseVideo.objects.create(course=self.course, title=str(i), video="videos/1.mp4") for i in range(4)]
+        new_order = [videos[2].id, videos[0].id, videos[1].id, videos[3].id]
+        response = self.client.put(f"/api/course-videos/{self.course.id}/", {"videos": new_order}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(CourseVideo.objects.filter(course=self.course).values_list("id", flat=True)), new_order)
+
+        response = self.client.put(f"/api/course-videos/{self.course.id}/", {"videos": new_order[:3]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class CourseVideoStreamTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.enterContext(self.settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        self.student = User.objects.create_user(
+            username="student", email="student@example.com", password="password"
+        )
+        course = Course.objects.create(name="Course", description="description")
+        Enrollment.objects.create(course=course, student=self.student, status="approved")
+        self.content = bytes(range(256)) * 4
+        self.video = CourseVideo.objects.create(
+            course=course, title="Video", video=SimpleUploadedFile("lecture.mp4", self.content)
+        )
+        self.url = f"/api/course-videos/stream/{self.video.id}/"
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def get(self, **headers):
+        return self.client.get(self.url, headers=headers)
+
+    def test_full_and_ranged_responses(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Type"], "video/mp4")
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+
+        response = self.get(Range="bytes=100-199")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 100-199/1024")
+        self.assertEqual(response["Content-Length"], "100")
+        self.assertEqual(b"".join(response.streaming_content), self.content[100:200])
+
+        response = self.get(Range="bytes=-24")
+        self.assertEqual(b"".join(response.streaming_content), self.content[-24:])
+        self.assertEqual(self.get(Range="bytes=2000-").status_code, 416)
+
+    def test_conditional_requests(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(**{"If-None-Match": etag}).status_code, 304)
+        self.assertEqual(self.get(Range="bytes=0-9", **{"If-Range": etag}).status_code, 206)
+        self.assertEqual(self.get(Range="bytes=0-9", **{"If-Range": '"stale"'}).status_code, 200)
+
+    def test_offload_and_permissions(self):
+        with self.settings(VIDEO_STREAM_OFFLOAD="X-Accel-Redirect"):
+            response = self.get(Range="bytes=0-9")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.video.video.name}")
+        self.assertEqual(response.content, b"")
+
+        outsider = User.objects.create_user(username="outsider", email="outsider@example.com", password="password")
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.get().status_code, 403)
+
+
+class VideoUploadTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.enterContext(
+            self.settings(
+                MEDIA_ROOT=tempfile.mkdtemp(), VIDEO_UPLOAD_TEMP_DIR=tempfile.mkdtemp(), VIDEO_UPLOAD_MIN_CHUNK_SIZE=1000
+            )
+        )
+        self.instructor = User.objects.create_user(
+            username="instructor", email="instructor@example.com", password="password", role="instructor"
+        )
+        self.course = Course.objects.create(name="Course", description="description")
+        self.course.instructors.add(self.instructor)
+        self.client = APIClient()
+        self.client.force_authenticate(self.instructor)
+        self.content = bytes(range(256)) * 10
+
+    def start(self):
+        response = self.client.post(
+            f"/api/video_uploads/course/{self.course.id}/",
+            {"title": "Lecture", "filename": "../lecture.mp4", "size": len(self.content), "chunk_size": 1000},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def put_chunk(self, session, index, data):
+        return self.client.put(
+            f"/api/video_uploads/{session['id']}/chunks/{index}/", data, content_type="application/octet-stream"
+        )
+
+    def test_chunks_in_any_order_are_assembled_into_a_video(self):
+        session = self.start()
+        self.assertEqual(session["chunk_count"], 3)
+        for index in (2, 0):
+            self.assertEqual(self.put_chunk(session, index, self.content[index * 1000 : index * 1000 + 1000]).status_code, 204)
+        self.assertEqual(self.client.post(f"/api/video_uploads/{session['id']}/").status_code, 400)
+
+        # resume: ask what is missing, send it (a retried chunk is harmless)
+        status_response = self.client.get(f"/api/video_uploads/{session['id']}/")
+        self.assertEqual(status_response.data["received_chunks"], [0, 2])
+        self.put_chunk(session, 1, self.content[1000:2000])
+        self.put_chunk(session, 1, self.content[1000:2000])
+
+        response = self.client.post(f"/api/video_uploads/{session['id']}/")
+        self.assertEqual(response.status_code, 201, response.data)
+        video = CourseVideo.objects.get(id=response.data["id"])
+        self.assertEqual((video.title, video.order), ("Lecture", 1))
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(video.video.name, f"blobs/{digest[:2]}/{digest[2:4]}/{digest}.mp4")
+        with video.video.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(VideoUploadSession.objects.exists())
+        self.assertEqual(os.listdir(settings.VIDEO_UPLOAD_TEMP_DIR), [])
+
+    def test_wrong_chunk_length_is_rejected(self):
+        session = self.start()
+        self.assertEqual(self.put_chunk(session, 0, self.content[:999]).status_code, 400)
+        self.assertEqual(self.put_chunk(session, 0, self.content[:1001]).status_code, 400)
+        self.assertEqual(self.put_chunk(session, 3, b"x").status_code, 400)
+
+    def test_finalize_once_and_survive_a_failed_save(self):
+        session = self.start()
+        for index in range(3):
+            self.put_chunk(session, index, self.content[index * 1000 : index * 1000 + 1000])
+        stale = VideoUploadSession.objects.get(id=session["id"])
+
+        def fail(**kwargs):
+            raise RuntimeError("database went away")
+
+        post_save.connect(fail, sender=CourseVideo)
+        try:
+            with self.assertRaises(RuntimeError):
+                finalize(stale)
+        finally:
+            post_save.disconnect(fail, sender=CourseVideo)
+        self.assertFalse(CourseVideo.objects.exists())
+        with open(stale.temp_path, "rb") as file:
+            self.assertEqual(file.read(), self.content)
+
+        self.assertEqual(self.client.post(f"/api/video_uploads/{session['id']}/").status_code, 201)
+        # a finalize that lost the race to it
+        with self.assertRaises(UploadGone):
+            finalize(stale)
+        self.assertEqual(CourseVideo.objects.count(), 1)
+
+    def test_chunks_of_a_finished_upload_are_not_written(self):
+        session = self.start()
+        stale = VideoUploadSession.objects.get(id=session["id"])
+        self.client.delete(f"/api/video_uploads/{session['id']}/")
+        with self.assertRaises(UploadGone):
+            write_chunk(stale, 0, io.BytesIO(self.content[:1000]))
+
+    def test_size_is_bounded(self):
+        with self.settings(VIDEO_UPLOAD_MAX_SIZE=len(self.content) - 1):
+            response = self.client.post(
+                f"/api/video_uploads/course/{self.course.id}/",
+                {"title": "Lecture", "filename": "lecture.mp4", "size": len(self.content)},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("size", response.data)
+
+        response = self.client.post(
+            f"/api/video_uploads/course/{self.course.id}/",
+            {"title": "Lecture", "filename": "lecture.mp4", "size": len(self.content), "chunk_size": 999},
+            format="json",
+        )
+        self.assertIn("chunk_size", response.data)
+        self.assertEqual(os.listdir(settings.VIDEO_UPLOAD_TEMP_DIR), [])
+
+    def test_cleanup_removes_abandoned_sessions(self):
+        session = self.start()
+        VideoUploadSession.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        call_command("cleanup_video_uploads", stdout=io.StringIO())
+        self.assertFalse(VideoUploadSession.objects.filter(id=session["id"]).exists())
+        self.assertEqual(os.listdir(settings.VIDEO_UPLOAD_TEMP_DIR), [])
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.enterContext(self.settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        self.course = Course.objects.create(name="Course", description="description")
+        self.other_course = Course.objects.create(name="Other", description="description")
+
+    def upload(self, course, content):
+        return CourseVideo.objects.create(
+            course=course, title="Intro", video=SimpleUploadedFile("intro.mp4", content)
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.upload(self.course, b"intro video")
+            second = self.upload(self.other_course, b"intro video")
+            other = self.upload(self.course, b"outro video")
+        digest = hashlib.sha256(b"intro video").hexdigest()
+        self.assertEqual(first.video.name, second.video.name)
+        self.assertEqual(first.video.name, f"blobs/{digest[:2]}/{digest[2:4]}/{digest}.mp4")
+        self.assertNotEqual(first.video.name, other.video.name)
+        self.assertEqual(MediaBlob.objects.get(name=first.video.name).references, 2)
+        self.assertEqual(first.video.storage.etag(first.video.name), f'"{digest}"')
+
+        path = first.video.path
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(os.path.exists(path))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(MediaBlob.objects.filter(name=first.video.name).exists())
+
+    def test_blob_taken_back_before_its_removal_is_kept(self):
+        video = self.upload(self.course, b"intro video")
+        path = video.video.path
+        with self.captureOnCommitCallbacks() as callbacks:
+            video.delete()
+        # the same content is saved again between the release and the unlink
+        again = self.upload(self.other_course, b"intro video")
+        for callback in callbacks:
+            callback()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(MediaBlob.objects.get(name=again.video.name).references, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            again.delete()
+        self.assertFalse(os.path.exists(path))
+        # and a later save brings the file back
+        self.assertTrue(os.path.exists(self.upload(self.course, b"intro video").video.path))
+
+    def test_files_of_rolled_back_saves_are_swept(self):
+        kept = self.upload(self.course, b"kept video")
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                lost = self.upload(self.course, b"rolled back video")
+                raise RuntimeError
+        self.assertTrue(os.path.exists(lost.video.path))
+        self.assertFalse(MediaBlob.objects.filter(name=lost.video.name).exists())
+
+        storage = kept.video.storage
+        # too recent: may belong to a transaction still running
+        self.assertEqual(storage.remove_orphans(time.time() - 3600), 0)
+        for video in (kept, lost):
+            os.utime(video.video.path, (time.time() - 2 * settings.VIDEO_UPLOAD_SESSION_TIMEOUT,) * 2)
+        call_command("cleanup_video_uploads", stdout=io.StringIO())
+        self.assertFalse(os.path.exists(lost.video.path))
+        self.assertTrue(os.path.exists(kept.video.path))
+
+    def test_replacing_a_file_releases_the_old_blob(self):
+        video = self.upload(self.course, b"first cut")
+        old_path = video.video.path
+        video = CourseVideo.objects.get(id=video.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            video.video = SimpleUploadedFile("intro.mp4", b"second cut")
+            video.save()
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(MediaBlob.objects.get().name, video.video.name)
+
+
+def mp4_box(box_type, payload):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def make_mp4(seconds, width, height, moov_last=False):
+    mvhd = mp4_box(b"mvhd", struct.pack(">B3xIIII", 0, 0, 0, 1000, int(seconds * 1000)) + bytes(80))
+    tkhd = mp4_box(b"tkhd", struct.pack(">B3x", 0) + bytes(72) + struct.pack(">II", width << 16, height << 16))
+    sound = mp4_box(b"trak", mp4_box(b"tkhd", struct.pack(">B3x", 0) + bytes(80)))
+    moov = mp4_box(b"moov", mvhd + sound + mp4_box(b"trak", tkhd))
+    boxes = [mp4_box(b"ftyp", b"isom" + bytes(4)), moov, mp4_box(b"mdat", bytes(5000))]
+    if moov_last:
+        boxes[1], boxes[2] = boxes[2], boxes[1]
+    return b"".join(boxes)
+
+
+def ebml(element_id, payload, unknown_size=False):
+    size = b"\x01\xff\xff\xff\xff\xff\xff\xff" if unknown_size else b"\x01" + len(payload).to_bytes(7, "big")
+    return element_id + size + payload
+
+
+def make_webm(seconds, width, height):
+    info = ebml(b"\x15\x49\xa9\x66", ebml(b"\x2a\xd7\xb1", (1_000_000).to_bytes(3, "big")) + ebml(b"\x44\x89", struct.pack(">d", seconds * 1000)))
+    video = ebml(b"\xe0", ebml(b"\xb0", width.to_bytes(8, "big")) + ebml(b"\xba", height.to_bytes(8, "big")))
+    tracks = ebml(b"\x16\x54\xae\x6b", ebml(b"\xae", ebml(b"\xd7", b"\x01") + video))
+    cluster = ebml(b"\x1f\x43\xb6\x75", bytes(5000))
+    segment = ebml(b"\x18\x53\x80\x67", info + tracks + cluster, unknown_size=True)
+    return ebml(b"\x1a\x45\xdf\xa3", ebml(b"\x42\x82", b"webm")) + segment
+
+
+class VideoProbeTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+
+    def test_mp4(self):
+        for moov_last in (False, True):
+            data = make_mp4(120, 1280, 720, moov_last=moov_last)
+            info = probe(io.BytesIO(data))
+            self.assertEqual(info, (120.0, 1280, 720, round(len(data) * 8 / 120)))
+
+    def test_webm(self):
+        data = make_webm(90, 640, 480)
+        self.assertEqual(probe(io.BytesIO(data))[:3], (90.0, 640, 480))
+
+    def test_implausible_headers_are_not_probed(self):
+        for data in (
+            make_webm(float("nan"), 640, 480),
+            make_webm(-90, 640, 480),
+            make_webm(90, 640, 0),
+            make_webm(90, 2**40, 480),
+            make_webm(1e-9, 640, 480),
+        ):
+            with self.assertRaises(ProbeError):
+                probe(io.BytesIO(data))
+
+        # nor do they fail the upload
+        self.enterContext(self.settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        course = Course.objects.create(name="Course", description="description")
+        video = CourseVideo.objects.create(
+            course=course, title="Lecture", video=SimpleUploadedFile("lecture.webm", make_webm(float("nan"), 640, 480))
+        )
+        self.assertIsNone(video.duration)
+
+    def test_unknown_or_truncated_files(self):
+        for data in (b"not a video at all", make_mp4(10, 320, 240)[:40]):
+            with self.assertRaises(ProbeError):
+                probe(io.BytesIO(data))
+
+    def test_upload_is_probed_and_completion_can_be_weighted_by_duration(self):
+        self.enterContext(self.settings(MEDIA_ROOT=tempfile.mkdtemp()))
+        student = User.objects.create_user(username="student", email="student@example.com", password="password")
+        course = Course.objects.create(name="Course", description="description")
+        Enrollment.objects.create(course=course, student=student, status="approved")
+        clip = CourseVideo.objects.create(course=course, title="Clip", video=SimpleUploadedFile("clip.mp4", make_mp4(60, 640, 360)))
+        CourseVideo.objects.create(course=course, title="Lecture", video=SimpleUploadedFile("lecture.webm", make_webm(540, 1920, 1080)))
+        self.assertEqual((clip.duration, clip.width, clip.height), (60.0, 640, 360))
+
+        progress = CourseProgressTracking.objects.create(student=student, course=course)
+        progress.completed_videos.add(clip)
+        client = APIClient()
+        client.force_authenticate(student)
+        url = f"/api/student_course_progress_tracking/{course.id}/"
+        self.assertEqual(client.get(url).data["completion_percentage"], 50)
+        self.assertEqual(client.get(url, {"completion": "duration"}).data["completion_percentage"], 10)
+
+    def test_duration_completion_of_the_listing_reads_no_deferred_fields(self):
+        instructor = User.objects.create_user(
+            username="instructor", email="instructor@example.com", password="password", role="instructor"
+        )
+        course = Course.objects.create(name="Course", description="description")
+        course.instructors.add(instructor)
+        videos = [
+            CourseVideo.objects.create(course=course, title=f"{i}", video=f"videos/{i}.mp4", duration=60 * (i + 1))
+            for i in range(5)
+        ]
+        for i in range(3):
+            student = User.objects.create_user(username=f"student{i}", email=f"student{i}@example.com", password="password")
+            Enrollment.objects.create(course=course, student=student, instructor=instructor, status="approved")
+            CourseProgressTracking.objects.create(student=student, course=course).completed_videos.add(*videos[: i + 1])
+        client = APIClient()
+        client.force_authenticate(instructor)
+        url = f"/api/instructor_students_course_progress_tracking/{course.id}/"
+        client.get(url)
+        with CaptureQueriesContext(connection) as by_count:
+            client.get(url)
+        with CaptureQueriesContext(connection) as by_duration:
+            response = client.get(url, {"completion": "duration"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(by_duration), len(by_count))
+
+
+class WatchHeartbeatTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        watch_positions.take()
+        self.enterContext(self.settings(MEDIA_ROOT=tempfile.mkdtemp(), WATCH_FLUSH_INTERVAL=3600))
+        self.student = User.objects.create_user(username="student", email="student@example.com", password="password")
+        self.course = Course.objects.create(name="Course", description="description")
+        Enrollment.objects.create(course=self.course, student=self.student, status="approved")
+        self.video = CourseVideo.objects.create(
+            course=self.course, title="Lecture", video=SimpleUploadedFile("lecture.mp4", make_mp4(100, 640, 360))
+        )
+        self.url = f"/api/course-videos/heartbeat/{self.video.id}/"
+        self.client = APIClient()
+        self.client.force_authenticate(self.student)
+
+    def beat(self, position):
+        return self.client.post(self.url, {"position": position}, format="json")
+
+    def test_heartbeats_are_coalesced_until_flushed(self):
+        self.assertEqual(self.beat(0).status_code, 204)
+        with CaptureQueriesContext(connection) as queries:
+            for position in range(10, 100, 10):
+                self.assertEqual(self.beat(position).status_code, 204)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(self.client.get(self.url).data["position"], 90)
+        self.assertFalse(VideoWatchPosition.objects.exists())
+
+        self.assertEqual(watch_positions.flush(), 1)
+        self.assertEqual(VideoWatchPosition.objects.get().position, 90)
+        progress = CourseProgressTracking.objects.get(student=self.student, course=self.course)
+        self.assertEqual(list(progress.completed_videos.all()), [self.video])
+        self.assertEqual(progress.completed_count, 1)
+
+        # rewatching the start moves the position but keeps the completion
+        self.beat(5)
+        watch_positions.flush()
+        self.assertEqual(VideoWatchPosition.objects.get().position, 5)
+        progress.refresh_from_db()
+        self.assertEqual(progress.completed_count, 1)
+
+    def test_flush_thread_and_reads_from_other_processes(self):
+        self.beat(42)
+        self.assertTrue(watch_positions.thread.is_alive())
+        # another process has none of this buffer, only the cache
+        watch_positions.take()
+        self.assertEqual(self.client.get(self.url).data["position"], 42)
+
+    def test_due_buffer_is_written_in_the_request(self):
+        with self.settings(WATCH_FLUSH_INTERVAL=0):
+            self.beat(30)
+        self.assertEqual(len(watch_positions), 0)
+        self.assertEqual(VideoWatchPosition.objects.get().position, 30)
+        self.assertFalse(CourseProgressTracking.objects.filter(completed_count__gt=0).exists())
+
+    def test_failing_rows_are_dropped_not_retried(self):
+        other = User.objects.create_user(username="other", email="other@example.com", password="password")
+        watch_positions.record(self.student.id, self.video.id, self.course.id, 100.0, 40)
+        # a NULL position once stored: fails on its own
+        watch_positions.record(other.id, self.video.id, self.course.id, 100.0, float("nan"))
+        with self.assertLogs("api.heartbeats", "ERROR"):
+            self.assertEqual(watch_positions.flush(), 1)
+        self.assertEqual(len(watch_positions), 0)
+        self.assertEqual(VideoWatchPosition.objects.get().position, 40)
+
+        self.beat(50)
+        self.assertEqual(watch_positions.flush(), 1)
+        self.assertEqual(VideoWatchPosition.objects.get().position, 50)
 
-# Create your tests here.
+    def test_validation_and_permissions(self):
+        for position in (-1, "NaN", "inf", "1e400"):
+            self.assertEqual(self.beat(position).status_code, 400)
+        # past the end counts as the end
+        self.beat(250)
+        self.assertEqual(self.client.get(self.url).data["position"], 100)
+        watch_positions.take()
+        self.assertEqual(self.client.post("/api/course-videos/heartbeat/0/", {"position": 1}).status_code, 404)
+        outsider = User.objects.create_user(username="outsider", email="outsider@example.com", password="password")
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.beat(10).status_code, 403)
+        self.assertEqual(len(watch_positions), 0)
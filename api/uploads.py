@@ -0,0 +1,116 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CourseVideo, VideoUploadChunk, VideoUploadSession
+
+BLOCK_SIZE = 256 * 1024
+# received chunks larger than this are spooled to disk
+SPOOL_SIZE = 8 * 1024 * 1024
+
+
+class ChunkLengthError(ValueError):
+    pass
+
+
+class UploadGone(Exception):
+    # finalized (or aborted) by another request meanwhile
+    pass
+
+
+class AssembledFile(File):
+    # FileSystemStorage moves a file exposing temporary_file_path() into
+    # place instead of copying it
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def create_temp_file(session):
+    os.makedirs(settings.VIDEO_UPLOAD_TEMP_DIR, exist_ok=True)
+    # sparse on most filesystems: chunks fill it in at their offsets
+    with open(session.temp_path, "wb") as file:
+        file.truncate(session.size)
+
+
+def write_chunk(session, index, stream):
+    """
+    Copy one chunk from the request stream to its offset in the temp file.
+    Rewriting a chunk (a retry) is harmless.
+
+    The chunk is spooled first, then written under the session row lock
+    that finalize() takes, so a late write can't land in a file that has
+    become a stored video. Receiving it, the slow part, holds no lock and
+    chunks of one upload can arrive in parallel.
+    """
+    expected = session.chunk_length(index)
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, dir=settings.VIDEO_UPLOAD_TEMP_DIR) as spool:
+        received = 0
+        while stream is not None:
+            block = stream.read(BLOCK_SIZE)
+            if not block:
+                break
+            received += len(block)
+            if received > expected:
+                raise ChunkLengthError(f"Chunk {index} must be {expected} bytes")
+            spool.write(block)
+        if received != expected:
+            raise ChunkLengthError(f"Chunk {index} must be {expected} bytes")
+        spool.seek(0)
+
+        with transaction.atomic():
+            if not VideoUploadSession.objects.select_for_update().filter(id=session.id).exists():
+                raise UploadGone
+            try:
+                fd = os.open(session.temp_path, os.O_WRONLY)
+            except FileNotFoundError:
+                raise UploadGone
+            try:
+                offset = index * session.chunk_size
+                for block in iter(lambda: spool.read(BLOCK_SIZE), b""):
+                    block = memoryview(block)
+                    while block:
+                        count = os.pwrite(fd, block, offset)
+                        offset += count
+                        block = block[count:]
+            finally:
+                os.close(fd)
+            VideoUploadChunk.objects.bulk_create([VideoUploadChunk(session=session, index=index)], ignore_conflicts=True)
+            VideoUploadSession.objects.filter(id=session.id).update(updated_at=timezone.now())
+
+
+def finalize(session):
+    """Turn a complete upload into a CourseVideo at the end of the playlist."""
+    with transaction.atomic():
+        # a concurrent finalize waits here, then finds the session gone
+        if not VideoUploadSession.objects.select_for_update().filter(id=session.id).exists():
+            raise UploadGone
+        # the storage moves the file it is given into place: give it a second
+        # link, so a failed save leaves the upload whole to finalize again
+        link_path = f"{session.temp_path}.finalize"
+        try:
+            os.remove(link_path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.link(session.temp_path, link_path)
+        except FileNotFoundError:
+            raise UploadGone
+        try:
+            with open(link_path, "rb") as file:
+                video = CourseVideo(
+                    course_id=session.course_id,
+                    title=session.title,
+                    video=AssembledFile(file, name=session.filename),
+                )
+                video.save()
+        finally:
+            try:
+                os.remove(link_path)
+            except FileNotFoundError:
+                pass
+        session.discard()
+    return video
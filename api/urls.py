@@ -13,6 +13,8 @@ urlpatterns = [
     path("update_user_password/", UpdateUserPasswordAPIView.as_view()),
     path("course/", CourseAPIView.as_view()),
     path("course/<int:pk>/", CourseAPIView.as_view()),
+    path("course_autocomplete/", CourseAutocompleteAPIView.as_view()),
+    path("course_cache_stats/", CourseCacheStatsAPIView.as_view()),
     path("course_instructors/", CourseInstructorsAPIView.as_view()),
     path("course_instructors/<int:pk>/", CourseInstructorsAPIView.as_view()),
     path("Instructor_courses/", InstructorAssignedCoursesAPIView.as_view()),
@@ -22,6 +24,11 @@ urlpatterns = [
     path("student_enrollment/<int:pk>/", StudentEnrollmentAPIView.as_view()),
     path("instructor_students/", InstructorStudentsAPIView.as_view()),
     path("course-videos/<int:pk>/", CourseVideoAPIView.as_view()),
+    path("course-videos/stream/<int:pk>/", CourseVideoStreamAPIView.as_view()),
+    path("course-videos/heartbeat/<int:pk>/", CourseVideoHeartbeatAPIView.as_view()),
+    path("video_uploads/course/<int:pk>/", VideoUploadAPIView.as_view()),
+    path("video_uploads/<uuid:session_id>/", VideoUploadSessionAPIView.as_view()),
+    path("video_uploads/<uuid:session_id>/chunks/<int:index>/", VideoUploadChunkAPIView.as_view()),
     path("course-comments/<int:pk>/", CourseCommentAPIView.as_view()),
     path("course-likes/<int:pk>/", CourseLikeAPIView.as_view()),
     path("course-rating/<int:pk>/", CourseRatingAPIView.as_view()),
@@ -33,10 +40,17 @@ urlpatterns = [
         "instructor_students_course_progress_tracking/<int:pk>/",
         InstructorStudentsCourseProgressTrackingAPIView.as_view(),
     ),
+    path(
+        "instructor_course_progress_matrix/<int:pk>/",
+        InstructorCourseProgressMatrixAPIView.as_view(),
+    ),
     path("quiz/", QuizAPIView.as_view()),
     path("quiz/<int:pk>/", QuizAPIView.as_view()),
+    path("quiz_analytics/<int:pk>/", QuizAnalyticsAPIView.as_view()),
     path("quiz_question/", QuizQuestionAPIView.as_view()),
     path("quiz_question/<int:pk>/", QuizQuestionAPIView.as_view()),
+    path("quiz_question_import/<int:pk>/", QuizQuestionImportAPIView.as_view()),
+    path("quiz_question_grades/<int:pk>/", QuestionGradingAPIView.as_view()),
     path("quiz_attempt/", QuizAttemptAPIView.as_view()),
     path("quiz_attempt/<int:pk>/", QuizAttemptAPIView.as_view()),
 ]
@@ -1,14 +1,33 @@
-from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
-from django.http import Http404
+import base64
+
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Prefetch
+from django.db import transaction
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import exceptions, status
 from rest_framework.exceptions import APIException, NotFound, PermissionDenied
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from .analytics import get_quiz_statistics
+from .cache import (
+    get_course_detail,
+    get_course_listing,
+    get_quiz_payload,
+    get_stats,
+    get_video_meta,
+    get_watch_position,
+    invalidate_course,
+)
+from .grading import recompute_quiz_attempt_scores
+from .heartbeats import watch_positions
 from .models import (
+    AnswerAttempt,
     Course,
     CourseComment,
     CourseLike,
@@ -20,7 +39,10 @@ from .models import (
     Quiz,
     QuizAttempt,
     User,
+    VideoUploadSession,
+    VideoWatchPosition,
 )
+from .pagination import PaginationMixin
 from .permissions import (
     IsAdminOrInstructor,
     IsAdminOrInstructorOrStudentRelatedToCourse,
@@ -33,6 +55,10 @@ from .permissions import (
     IsUser,
     IsUserorAdmin,
 )
+from .question_bank import import_questions, iter_csv_rows, iter_jsonl_rows, load_json_rows
+from .search import get_name_index, get_search_backend
+from .streaming import stream_file
+from .uploads import ChunkLengthError, UploadGone, create_temp_file, finalize, write_chunk
 from .serializer import (
     CourseCommentSerializer,
     CourseLikeSerializer,
@@ -42,8 +68,12 @@ from .serializer import (
     CourseVideoSerializer,
     EnrollmentSerializer,
     Loginserializer,
+    QuestionGradesSerializer,
     QuestionSerializer,
+    VideoUploadSessionSerializer,
+    WatchHeartbeatSerializer,
     QuizAttemptSerializer,
+    QuizAttemptSubmissionSerializer,
     QuizSerializer,
     UpadateUserPasswordSerializer,
     UserSerializer,
@@ -109,7 +139,9 @@ class LoginAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserAPIView(BaseAPIView):
+class UserAPIView(PaginationMixin, BaseAPIView):
+    keyset_ordering_fields = ["id", "date_joined"]
+
     def get_object(self, pk):
         user = get_object_or_404(User, pk=pk)
         self.check_object_permissions(self.request, user)
@@ -138,8 +170,7 @@ class UserAPIView(BaseAPIView):
                     status=status.HTTP_403_FORBIDDEN,
                 )
             user = User.objects.all()
-            serializer = UserSerializer(user, many=True)
-            return Response(serializer.data)
+            return self.paginate(user, UserSerializer)
 
     def patch(self, request, pk):
         try:
@@ -186,7 +217,8 @@ class UpdateUserPasswordAPIView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class CourseAPIView(BaseAPIView):
+class CourseAPIView(PaginationMixin, BaseAPIView):
+    SEARCH_RESULTS_LIMIT = 1000
 
     def get_permissions(self):
         if self.request.method in ["POST", "PUT", "PATCH", "DELETE"]:
@@ -195,29 +227,29 @@ class CourseAPIView(BaseAPIView):
 
     def get(self, request, pk=None):
         if pk:
-            course = get_object_or_404(Course, pk=pk)
-            serializer = CourseSerializer(course)
-            return Response(serializer.data)
+            data = get_course_detail(
+                pk,
+                lambda: CourseSerializer(
+                    get_object_or_404(Course.objects.for_listing(), pk=pk)
+                ).data,
+            )
+            return Response(data)
         else:
-            # Full Text Search
+            # Full Text Search; only the top SEARCH_RESULTS_LIMIT matches
+            # are ranked into the paginated result
             q = request.query_params.get("search", None)
             if q:
-                search_vector = SearchVector("name", "description")
-                search_query = SearchQuery(q)
-                course = (
-                    Course.objects.annotate(
-                        rank=SearchRank(search_vector, search_query)
-                    )
-                    .filter(rank__gte=0.01)
-                    .order_by("-rank")
-                )
+                course = get_search_backend().search(q, self.SEARCH_RESULTS_LIMIT)
             else:
                 course = Course.objects.all()
 
-            serializer = CourseSerializer(
-                course, fields=["id", "name", "description"], many=True
+            data = get_course_listing(
+                request,
+                lambda: self.paginate(
+                    course, CourseSerializer, keyset=not q, fields=["id", "name", "description"]
+                ).data,
             )
-            return Response(serializer.data)
+            return Response(data)
 
     def post(self, request):
         serializer = CourseSerializer(
@@ -257,13 +289,35 @@ class CourseAPIView(BaseAPIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class InstructorAssignedCoursesAPIView(APIView):
+class CourseCacheStatsAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUserRole]
+
+    def get(self, request):
+        return Response(get_stats())
+
+
+class CourseAutocompleteAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    MAX_LIMIT = 20
+
+    def get(self, request):
+        prefix = request.query_params.get("q", "")
+        try:
+            limit = min(int(request.query_params.get("limit", 10)), self.MAX_LIMIT)
+        except ValueError:
+            return Response(
+                {"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        matches = get_name_index().complete(prefix, limit)
+        return Response([{"id": course_id, "name": name} for course_id, name in matches])
+
+
+class InstructorAssignedCoursesAPIView(PaginationMixin, APIView):
     permission_classes = [IsAuthenticated, IsInstructorUserRole]
 
     def get(self, request):
-        instructor_courses = request.user.courses.all()
-        serializer = CourseSerializer(instructor_courses, many=True)
-        return Response(serializer.data)
+        instructor_courses = request.user.courses.for_listing()
+        return self.paginate(instructor_courses, CourseSerializer)
 
 
 class CourseInstructorsAPIView(APIView):
@@ -271,7 +325,7 @@ class CourseInstructorsAPIView(APIView):
 
     def get(self, request, pk):
         try:
-            course = Course.objects.get(id=pk)
+            course = Course.objects.for_listing().get(id=pk)
             serializer = CourseSerializer(
                 course, fields=["id", "name", "description", "instructors"]
             )
@@ -285,7 +339,7 @@ class CourseInstructorsAPIView(APIView):
                             status=status.HTTP_400_BAD_REQUEST)
 
 
-class StudentEnrollmentAPIView(APIView):
+class StudentEnrollmentAPIView(PaginationMixin, APIView):
     permission_classes = [IsAuthenticated, IsStudentUserRole]
 
     def get(self, request, pk=None):
@@ -298,7 +352,7 @@ class StudentEnrollmentAPIView(APIView):
 
         if pk:
             try:
-                enrollment = Enrollment.objects.get(id=pk)
+                enrollment = Enrollment.objects.for_listing().get(id=pk)
                 if enrollment.student.id != student.id:
                     return Response(
                         {"error": "You are not authorized to view this enrollment"},
@@ -311,9 +365,8 @@ class StudentEnrollmentAPIView(APIView):
                     {"error": "Enrollment not found"}, status=status.HTTP_404_NOT_FOUND
                 )
 
-        enrollment = Enrollment.objects.filter(student=student)
-        serializer = EnrollmentSerializer(enrollment, many=True)
-        return Response(serializer.data)
+        enrollment = Enrollment.objects.for_listing().filter(student=student)
+        return self.paginate(enrollment, EnrollmentSerializer)
 
     def post(self, request):
         data = request.data
@@ -340,28 +393,27 @@ class StudentEnrollmentAPIView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class InstructorStudentsAPIView(APIView):
+class InstructorStudentsAPIView(PaginationMixin, APIView):
     permission_classes = [IsAuthenticated, IsAdminOrInstructor]
 
     def get(self, request):
         try:
             instructor = User.objects.get(id=request.user.id)
-            enrollment = Enrollment.objects.filter(instructor=instructor)
-            serializer = EnrollmentSerializer(enrollment, many=True)
-            return Response(serializer.data)
+            enrollment = Enrollment.objects.for_listing().filter(instructor=instructor)
+            return self.paginate(enrollment, EnrollmentSerializer)
         except User.DoesNotExist:
             return Response(
                 {"error": "User not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
 
-class EnrollmentAPIView(APIView):
+class EnrollmentAPIView(PaginationMixin, APIView):
     permission_classes = [IsAuthenticated, IsAdminUserRole]
 
     def get(self, request, pk=None):
         if pk:
             try:
-                enrollment = Enrollment.objects.get(id=pk)
+                enrollment = Enrollment.objects.for_listing().get(id=pk)
                 serializer = EnrollmentSerializer(enrollment)
                 return Response(serializer.data)
             except Enrollment.DoesNotExist:
@@ -369,9 +421,8 @@ class EnrollmentAPIView(APIView):
                     {"error": "Enrollment not found"}, status=status.HTTP_404_NOT_FOUND
                 )
         else:
-            enrollment = Enrollment.objects.all()
-            serializer = EnrollmentSerializer(enrollment, many=True)
-            return Response(serializer.data)
+            enrollment = Enrollment.objects.for_listing()
+            return self.paginate(enrollment, EnrollmentSerializer)
 
     def put(self, request, pk):
         try:
@@ -420,7 +471,7 @@ class CourseVideoAPIView(APIView):
     def get_permissions(self):
         if self.request.method == "GET":
             return [IsAuthenticated(), IsAdminOrInstructorOrStudentRelatedToCourse()]
-        if self.request.method in ["POST", "DELETE"]:
+        if self.request.method in ["POST", "PUT", "DELETE"]:
             return [IsAuthenticated(), IsAdminOrInstructorRelatedToCourse()]
         return Response(
             {"error": "Method not allowed"}, status=status.HTTP_405_METHOD_NOT_ALLOWED
@@ -451,9 +502,14 @@ class CourseVideoAPIView(APIView):
             {"error": "Course id is required"}, status=status.HTTP_400_BAD_REQUEST
         )
 
+    # several "video" files (each with a "title", in the same order) are
+    # created in one go and appended to the playlist in that order
     def post(self, request, pk):
         data = request.data
         course = self.get_object(pk)
+        files = request.FILES.getlist("video")
+        if len(files) > 1:
+            return self.bulk_create(request, course, files)
         data["course"] = course.id
         serializer = CourseVideoSerializer(data=request.data)
         if serializer.is_valid():
@@ -461,6 +517,76 @@ class CourseVideoAPIView(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def bulk_create(self, request, course, files):
+        titles = request.data.getlist("title")
+        if len(titles) != len(files):
+            return Response(
+                {"error": "Each video needs a title"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = CourseVideoSerializer(
+            data=[
+                {"title": title, "video": file}
+                for title, file in zip(titles, files)
+            ],
+            many=True,
+            fields=["title", "video"],
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            first = CourseVideo.reserve_orders(course.id, len(files))
+            videos = [
+                CourseVideo(course=course, order=first + i, **item)
+                for i, item in enumerate(serializer.validated_data)
+            ]
+            for video in videos:
+                video.probe_file()
+            videos = CourseVideo.objects.bulk_create(videos)
+            # bulk_create sends no post_save, so count them here
+            Course.all_objects.filter(id=course.id).update(
+                video_count=F("video_count") + len(videos)
+            )
+            transaction.on_commit(lambda: invalidate_course(course.id))
+        return Response(
+            CourseVideoSerializer(videos, many=True).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+    # expects {"videos": [<every video id of the course, in the new order>]}
+    def put(self, request, pk):
+        course = self.get_object(pk)
+        video_ids = request.data.get("videos", [])
+        if not isinstance(video_ids, list) or not all(
+            isinstance(video_id, int) for video_id in video_ids
+        ):
+            return Response(
+                {"error": "Videos must be a list of ids"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        with transaction.atomic():
+            CourseVideo.reserve_orders(course.id)
+            videos = {
+                video.id: video
+                for video in CourseVideo.objects.filter(course=course).only("id", "order")
+            }
+            if len(video_ids) != len(videos) or set(video_ids) != set(videos):
+                return Response(
+                    {"error": "Videos must list every video of the course once"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            now = timezone.now()
+            changed = []
+            for order, video_id in enumerate(video_ids, start=1):
+                video = videos[video_id]
+                if video.order != order:
+                    video.order = order
+                    video.updated_at = now
+                    changed.append(video)
+            CourseVideo.objects.bulk_update(changed, ["order", "updated_at"])
+            transaction.on_commit(lambda: invalidate_course(course.id))
+        return Response({"videos": video_ids})
+
     # specify the id's of the videos
     def delete(self, request, pk):
         course = self.get_object(pk)
@@ -476,7 +602,153 @@ class CourseVideoAPIView(APIView):
 
 
 # course id should be provided as pk
-class CourseCommentAPIView(APIView):
+# starts a resumable upload: {"title", "filename", "size", "chunk_size"?}; the
+# chunks are then PUT to video_uploads/<id>/chunks/<index>/ as raw bytes and
+# the upload finalized with a POST to video_uploads/<id>/
+class VideoUploadAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminOrInstructorRelatedToCourse]
+
+    def post(self, request, pk):
+        try:
+            course = Course.objects.get(id=pk)
+        except Course.DoesNotExist:
+            raise NotFound({"error": "Course not found"})
+        self.check_object_permissions(request, course)
+        serializer = VideoUploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        session = serializer.save(
+            course=course,
+            user=request.user,
+            chunk_size=serializer.validated_data.get(
+                "chunk_size", settings.VIDEO_UPLOAD_CHUNK_SIZE
+            ),
+        )
+        create_temp_file(session)
+        return Response(
+            VideoUploadSessionSerializer(session).data, status=status.HTTP_201_CREATED
+        )
+
+
+class VideoUploadSessionMixin:
+    # only the uploader can touch a session
+    def get_session(self, session_id):
+        try:
+            return VideoUploadSession.objects.get(id=session_id, user=self.request.user)
+        except VideoUploadSession.DoesNotExist:
+            raise NotFound({"error": "Upload not found"})
+
+
+# the upload's state, so a client can resume with the missing chunks
+class VideoUploadSessionAPIView(VideoUploadSessionMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id):
+        return Response(VideoUploadSessionSerializer(self.get_session(session_id)).data)
+
+    # finalize
+    def post(self, request, session_id):
+        session = self.get_session(session_id)
+        received = session.chunks.count()
+        if received != session.chunk_count:
+            return Response(
+                {"error": f"{session.chunk_count - received} chunks are missing"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            video = finalize(session)
+        except UploadGone:
+            raise NotFound({"error": "Upload not found"})
+        return Response(
+            CourseVideoSerializer(video).data, status=status.HTTP_201_CREATED
+        )
+
+    # abort
+    def delete(self, request, session_id):
+        self.get_session(session_id).discard()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class VideoUploadChunkAPIView(VideoUploadSessionMixin, APIView):
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, session_id, index):
+        session = self.get_session(session_id)
+        if index >= session.chunk_count:
+            return Response(
+                {"error": "Invalid chunk index"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        # read straight from the request stream, never request.data/body
+        try:
+            write_chunk(session, index, request.stream)
+        except ChunkLengthError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except UploadGone:
+            raise NotFound({"error": "Upload not found"})
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# CourseVideo id should be provided as pk
+# serves the video file itself, with byte ranges for seeking
+class CourseVideoStreamAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminOrInstructorOrStudentRelatedToCourse]
+
+    # video players ask for video/* which no renderer offers; errors still render as JSON
+    def perform_content_negotiation(self, request, force=False):
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, pk):
+        try:
+            video = CourseVideo.objects.only("id", "course_id", "video").get(id=pk)
+        except CourseVideo.DoesNotExist:
+            raise NotFound({"error": "CourseVideo not found"})
+        self.check_object_permissions(request, Course(id=video.course_id))
+        try:
+            return stream_file(request, video.video)
+        except FileNotFoundError:
+            raise NotFound({"error": "Video file not found"})
+
+
+# CourseVideo id should be provided as pk
+# players report the playback position every few seconds; see api/heartbeats.py
+class CourseVideoHeartbeatAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsStudentUserRole, IsStudentRelatedToCourse]
+
+    def get_video_meta(self, pk):
+        def build():
+            video = CourseVideo.objects.filter(id=pk).values_list("course_id", "duration").first()
+            # cache misses too, so unknown ids can't hammer the database
+            return video or (None, None)
+
+        course_id, duration = get_video_meta(pk, build)
+        if course_id is None:
+            raise NotFound({"error": "CourseVideo not found"})
+        self.check_object_permissions(self.request, Course(id=course_id))
+        return course_id, duration
+
+    def get(self, request, pk):
+        self.get_video_meta(pk)
+        position = get_watch_position(request.user.id, pk)
+        if position is None:
+            position = (
+                VideoWatchPosition.objects.filter(student=request.user, video_id=pk)
+                .values_list("position", flat=True)
+                .first()
+            )
+        return Response({"video": pk, "position": position or 0})
+
+    def post(self, request, pk):
+        course_id, duration = self.get_video_meta(pk)
+        serializer = WatchHeartbeatSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        watch_positions.record(request.user.id, pk, course_id, duration, serializer.validated_data["position"])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# course id should be provided as pk
+class CourseCommentAPIView(PaginationMixin, APIView):
+    keyset_ordering_fields = ["id", "created_at"]
+
     def get_permissions(self):
         if self.request.method in ["POST", "DELETE", "PATCH", "GET"]:
             return [IsAuthenticated(), IsAdminOrInstructorOrStudentRelatedToCourse()]
@@ -497,9 +769,8 @@ class CourseCommentAPIView(APIView):
     def get(self, request, pk=None):
         if pk:
             course = self.get_object(pk)
-            comments = CourseComment.objects.filter(course=course)
-            serializer = CourseCommentSerializer(comments, many=True)
-            return Response(serializer.data)
+            comments = CourseComment.objects.filter(course=course).select_related("user")
+            return self.paginate(comments, CourseCommentSerializer)
         return Response(
             {"error": "Course id is required"}, status=status.HTTP_400_BAD_REQUEST
         )
@@ -661,7 +932,7 @@ class StudentCourseProgressTrackingAPIView(APIView):
     def get(self, request, pk):
         course = self.get_object(pk)
         try:
-            course_progress = CourseProgressTracking.objects.get(
+            course_progress = CourseProgressTracking.objects.for_listing().get(
                 course=course, student=request.user
             )
         except CourseProgressTracking.DoesNotExist:
@@ -669,7 +940,11 @@ class StudentCourseProgressTrackingAPIView(APIView):
                 {"error": "CourseProgressTracking not found"},
                 status=status.HTTP_404_NOT_FOUND,
             )
-        serializer = CourseProgressTrackingSerializer(course_progress)
+        # ?completion=duration weighs videos by their length
+        serializer = CourseProgressTrackingSerializer(
+            course_progress,
+            context={"completion": request.query_params.get("completion")},
+        )
         return Response(serializer.data)
 
     def post(self, request, pk):
@@ -769,7 +1044,7 @@ class StudentCourseProgressTrackingAPIView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class InstructorStudentsCourseProgressTrackingAPIView(APIView):
+class InstructorStudentsCourseProgressTrackingAPIView(PaginationMixin, APIView):
     permission_classes = [IsAuthenticated, IsInstructorRelatedToCourse]
 
     def get_object(self, pk):
@@ -784,25 +1059,98 @@ class InstructorStudentsCourseProgressTrackingAPIView(APIView):
 
     def get(self, request, pk):
         course = self.get_object(pk)
+        # joined against the instructor's approved enrollments instead of
+        # materializing the students in Python
+        students_progress = CourseProgressTracking.objects.for_listing().filter(
+            course=course,
+            student__enrollments__course=course,
+            student__enrollments__instructor=request.user,
+            student__enrollments__status="approved",
+        )
+        return self.paginate(
+            students_progress,
+            CourseProgressTrackingSerializer,
+            context={"completion": request.query_params.get("completion")},
+        )
+
+
+# course id should be provided as pk
+class InstructorCourseProgressMatrixAPIView(APIView):
+    """
+    Compact completion matrix of the instructor's approved students.
+
+    "videos" lists the course video ids in playlist order. Each student's
+    "completed" is a base64 little-endian bitset where bit i is set when
+    videos[i] is completed; "video_completions" holds the column totals.
+    """
+    permission_classes = [IsAuthenticated, IsInstructorRelatedToCourse]
+
+    def get_object(self, pk):
         try:
-            instructor_students = Enrollment.objects.filter(
-                course=course, instructor=request.user, status="approved"
-            )
-        except Enrollment.DoesNotExist:
-            return Response(
-                {"error": "user not found"}, status=status.HTTP_404_NOT_FOUND
-            )
+            course = Course.objects.get(id=pk)
+        except Course.DoesNotExist:
+            raise NotFound({"error": "Course not found"})
+        self.check_object_permissions(self.request, course)
+        return course
 
-        students = [student.student for student in instructor_students]
-        students_progress = CourseProgressTracking.objects.filter(
-            course=course, student__in=students
+    def get(self, request, pk):
+        course = self.get_object(pk)
+        video_ids = list(
+            CourseVideo.objects.filter(course=course)
+            .order_by("order", "id")
+            .values_list("id", flat=True)
+        )
+        position = {video_id: i for i, video_id in enumerate(video_ids)}
+
+        enrollments = Enrollment.objects.filter(
+            course=course, instructor=request.user, status="approved"
+        )
+        students = list(enrollments.values_list("student_id", "student__username"))
+
+        # one pass over the through table: a (student, video) pair per completion
+        Completion = CourseProgressTracking.completed_videos.through
+        completions = (
+            Completion.objects.filter(
+                courseprogresstracking__course=course,
+                courseprogresstracking__student__in=enrollments.values("student_id"),
+                # progress rows can hold videos of other courses
+                coursevideo__course=course,
+            )
+            .values_list("courseprogresstracking__student_id", "coursevideo_id")
+            .order_by()
+        )
+        masks = dict.fromkeys((student_id for student_id, _ in students), 0)
+        video_completions = [0] * len(video_ids)
+        for student_id, video_id in completions.iterator():
+            i = position[video_id]
+            masks[student_id] |= 1 << i
+            video_completions[i] += 1
+
+        width = (len(video_ids) + 7) // 8
+        return Response(
+            {
+                "course": course.id,
+                "videos": video_ids,
+                "video_completions": video_completions,
+                "students": [
+                    {
+                        "id": student_id,
+                        "username": username,
+                        "completed": base64.b64encode(
+                            masks[student_id].to_bytes(width, "little")
+                        ).decode(),
+                        "completed_count": masks[student_id].bit_count(),
+                    }
+                    for student_id, username in students
+                ],
+            }
         )
-        serializer = CourseProgressTrackingSerializer(students_progress, many=True)
-        return Response(serializer.data)
 
 
 # Quiz id should be provided as pk
-class QuizAPIView(APIView):
+class QuizAPIView(PaginationMixin, APIView):
+    keyset_ordering_fields = ["id", "created_at"]
+
     def get_permissions(self):
         if self.request.method in ["GET"]:
             return [IsAuthenticated(), IsAdminOrInstructorOrStudentRelatedToCourse()]
@@ -823,16 +1171,25 @@ class QuizAPIView(APIView):
         self.check_object_permissions(self.request, course)
         return quiz
 
+    def render_quiz(self, pk):
+        try:
+            quiz = Quiz.objects.select_related("video").get(id=pk)
+        except Quiz.DoesNotExist:
+            raise NotFound({"error": "Quiz not found"})
+        return quiz.video.course_id, JSONRenderer().render(QuizSerializer(quiz).data)
+
     def get(self, request, pk=None):
         if pk:
-            quiz = self.get_object(pk)
-            serializer = QuizSerializer(quiz)
-            return Response(serializer.data)
-        quizzes = Quiz.objects.all()
-        serializer = QuizSerializer(
-            quizzes, fields=["id", "video", "title", "description"], many=True
+            # the rendered quiz (no answer keys) is cached until the quiz or
+            # its questions change; the membership check only needs the
+            # course id, so a cache hit touches no table
+            course_id, payload = get_quiz_payload(pk, lambda: self.render_quiz(pk))
+            self.check_object_permissions(request, Course(id=course_id))
+            return HttpResponse(payload, content_type="application/json")
+        quizzes = Quiz.objects.select_related("video")
+        return self.paginate(
+            quizzes, QuizSerializer, fields=["id", "video", "title", "description"]
         )
-        return Response(serializer.data)
 
     def post(self, request):
         try:
@@ -870,6 +1227,20 @@ class QuizAPIView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+# Quiz id should be provided as pk
+# item analysis (p-value, point-biserial) and score statistics of graded attempts
+class QuizAnalyticsAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminOrInstructorRelatedToCourse]
+
+    def get(self, request, pk):
+        try:
+            quiz = Quiz.objects.select_related("video__course").get(id=pk)
+        except Quiz.DoesNotExist:
+            raise NotFound({"error": "Quiz not found"})
+        self.check_object_permissions(request, quiz.video.course)
+        return Response(get_quiz_statistics(quiz))
+
+
 # Question id provided as pk
 class QuizQuestionAPIView(APIView):
 
@@ -893,7 +1264,9 @@ class QuizQuestionAPIView(APIView):
     def get(self, request, pk=None):
         if pk:
             question = self.get_object(pk)
-            serializer = QuestionSerializer(question)
+            serializer = QuestionSerializer(
+                question, context={"hide_answer_key": request.user.role == "student"}
+            )
             return Response(serializer.data)
         return Response(
             {"error": "Question id is required"}, status=status.HTTP_400_BAD_REQUEST
@@ -912,7 +1285,8 @@ class QuizQuestionAPIView(APIView):
         self.check_object_permissions(self.request, course)
 
         serializer = QuestionSerializer(
-            fields=["quiz", "question", "marks"], data=request.data
+            fields=["id", "quiz", "question", "question_type", "marks", "options"],
+            data=request.data,
         )
         if serializer.is_valid():
             serializer.save()
@@ -925,7 +1299,9 @@ class QuizQuestionAPIView(APIView):
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         serializer = QuestionSerializer(
-            question, fields=["question", "marks"], data=request.data
+            question,
+            fields=["question", "question_type", "marks", "options"],
+            data=request.data,
         )
         if serializer.is_valid():
             serializer.save()
@@ -938,6 +1314,63 @@ class QuizQuestionAPIView(APIView):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+# Quiz id should be provided as pk
+# expects either {"questions": [<question>, ...]} as JSON, or a "file" upload
+# of CSV (see question_bank.iter_csv_rows), JSON with an array of questions or
+# JSON Lines with one question per line
+class QuizQuestionImportAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminOrInstructorRelatedToCourse]
+
+    def post(self, request, pk):
+        try:
+            quiz = Quiz.objects.select_related("video__course").get(id=pk)
+        except Quiz.DoesNotExist:
+            return Response(
+                {"error": "Quiz not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        self.check_object_permissions(self.request, quiz.video.course)
+
+        upload = request.FILES.get("file")
+        if upload is not None:
+            if upload.name.lower().endswith(".csv"):
+                rows = iter_csv_rows(upload)
+            elif upload.name.lower().endswith(".jsonl"):
+                rows = iter_jsonl_rows(upload)
+            elif upload.name.lower().endswith(".json"):
+                try:
+                    rows = load_json_rows(upload)
+                except ValueError as e:
+                    return Response(
+                        {"error": f"Invalid JSON file: {e}"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+            else:
+                return Response(
+                    {"error": "Upload a .csv, .json or .jsonl file"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        elif isinstance(request.data.get("questions"), list):
+            rows = request.data["questions"]
+        else:
+            return Response(
+                {"error": "Questions or a file are required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        imported, errors = import_questions(quiz, rows)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+        quiz.refresh_from_db(fields=["total_marks", "passing_marks"])
+        return Response(
+            {
+                "imported": imported,
+                "total_marks": quiz.total_marks,
+                "passing_marks": quiz.passing_marks,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
 # QuizAttempt id should be provided as pk
 class QuizAttemptAPIView(APIView):
     def get_permissions(self):
@@ -950,23 +1383,36 @@ class QuizAttemptAPIView(APIView):
         )
 
     def get_object(self, pk):
+        # the course and the "is this the student's instructor" check come
+        # back with the attempt itself
         try:
-            quiz_attempt = QuizAttempt.objects.get(id=pk)
+            quiz_attempt = (
+                QuizAttempt.objects.select_related("quiz__video__course", "student")
+                .prefetch_related(
+                    Prefetch(
+                        "answers",
+                        queryset=AnswerAttempt.objects.select_related("question"),
+                    )
+                )
+                .annotate(
+                    is_students_instructor=Exists(
+                        Enrollment.objects.filter(
+                            course=OuterRef("quiz__video__course"),
+                            student=OuterRef("student"),
+                            status="approved",
+                            instructor=self.request.user.id,
+                        )
+                    )
+                )
+                .get(id=pk)
+            )
             course = quiz_attempt.quiz.video.course
         except QuizAttempt.DoesNotExist:
             raise QuizAttempt.DoesNotExist({"error": "QuizAttempt not found"})
         except Exception as e:
             return APIException({"error": str(e)})
         self.check_object_permissions(self.request, course)
-        student = quiz_attempt.student
-        if not (
-            Enrollment.objects.filter(
-                course=quiz_attempt.quiz.video.course,
-                student=student,
-                status="approved",
-                instructor=self.request.user.id,
-            ).exists()
-        ):
+        if not quiz_attempt.is_students_instructor:
             raise APIException(
                 {"error": "You are not authorized for this quiz attempt"}
             )
@@ -984,24 +1430,26 @@ class QuizAttemptAPIView(APIView):
     # expects quiz id and all the ralated question id's with answers
     def post(self, request):
         try:
-            quiz = Quiz.objects.get(id=request.data.get("quiz"))
+            quiz = Quiz.objects.select_related("video__course").get(
+                id=request.data.get("quiz")
+            )
             course = quiz.video.course
         except Quiz.DoesNotExist:
-            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+            return Response(
+                {"error": "Quiz not found"}, status=status.HTTP_404_NOT_FOUND
+            )
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         self.check_object_permissions(self.request, course)
 
-        request.data["student"] = request.user.id
-
-        quiz_serializer = QuizAttemptSerializer(
-            fields=["quiz", "student"], data=request.data
+        quiz_serializer = QuizAttemptSubmissionSerializer(
+            data=request.data, context={"quiz": quiz}
         )
 
         if not quiz_serializer.is_valid():
             return Response(quiz_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         try:
-            quiz_serializer.save()
+            quiz_serializer.save(student=request.user)
             return Response(
                 {"message": "Your Quiz Attempt Saved Successfully"},
                 status=status.HTTP_201_CREATED,
@@ -1040,3 +1488,73 @@ class QuizAttemptAPIView(APIView):
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         quiz_attempt.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+# Question id should be provided as pk
+# expects {"grades": {"<answer attempt id>": <is_correct>, ...}} covering any
+# number of the students who answered the question
+class QuestionGradingAPIView(APIView):
+    permission_classes = [IsAuthenticated, IsInstructorRelatedToCourse]
+
+    def get_object(self, pk):
+        try:
+            question = Question.objects.select_related("quiz__video__course").get(id=pk)
+        except Question.DoesNotExist:
+            raise NotFound({"error": "Question not found"})
+        self.check_object_permissions(self.request, question.quiz.video.course)
+        return question
+
+    def post(self, request, pk):
+        question = self.get_object(pk)
+        serializer = QuestionGradesSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        grades = serializer.validated_data["grades"]
+
+        # the whole batch is authorized by the same query that loads it
+        answers = list(
+            AnswerAttempt.objects.filter(id__in=grades, question=question)
+            .annotate(
+                is_students_instructor=Exists(
+                    Enrollment.objects.filter(
+                        course=question.quiz.video.course,
+                        student=OuterRef("quiz_attempt__student"),
+                        status="approved",
+                        instructor=request.user,
+                    )
+                )
+            )
+            .only("id", "quiz_attempt_id", "is_correct", "updated_at")
+        )
+        if len(answers) != len(grades):
+            return Response(
+                {"error": "Invalid answer id"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if not all(answer.is_students_instructor for answer in answers):
+            return Response(
+                {"error": "You are not authorized for these quiz attempts"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+
+        now = timezone.now()
+        for answer in answers:
+            answer.is_correct = grades[answer.id]
+            answer.updated_at = now
+        with transaction.atomic():
+            AnswerAttempt.objects.bulk_update(answers, ["is_correct", "updated_at"])
+            attempts = recompute_quiz_attempt_scores(
+                {answer.quiz_attempt_id for answer in answers}
+            )
+        return Response(
+            {
+                "graded": len(answers),
+                "quiz_attempts": [
+                    {
+                        "id": attempt.id,
+                        "marks_obtained": attempt.marks_obtained,
+                        "qualified_status": attempt.qualified_status,
+                    }
+                    for attempt in attempts.values()
+                ],
+            }
+        )